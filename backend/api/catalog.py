@@ -0,0 +1,236 @@
+from bisect import bisect_left
+from collections import OrderedDict
+from threading import Lock
+from time import monotonic
+from uuid import uuid4
+
+from django.core.cache import cache, caches
+
+from backend.constants import (CATALOG_VERSION_CHECK_INTERVAL,
+                               INGREDIENT_INDEX_MAX_SIZE,
+                               SHORT_LINK_CACHE_SIZE,
+                               SHORT_LINK_NOT_FOUND_CACHE_TIMEOUT)
+from recipes.models import Ingredient, Tag
+
+
+class Catalog:
+    """Базовый класс справочника, хранящегося в памяти процесса.
+
+    Загружается при первом обращении. Актуальность проверяется по метке
+    версии в общем кэше меток stamps, которую обновляют сигналы сохранения
+    и удаления объектов, поэтому изменения видны всем процессам gunicorn."""
+    version_key = None
+
+    def __init__(self):
+        self._lock = Lock()
+        self._version = None
+        self._checked_at = None
+
+    def _get_version(self):
+        """Возвращает текущую метку версии справочника."""
+        stamps = caches['stamps']
+        stamps.add(self.version_key, uuid4().hex, None)
+        return stamps.get(self.version_key)
+
+    def _load(self):
+        """Загружает справочник, если он устарел."""
+        now = monotonic()
+        if (self._checked_at is not None
+                and now - self._checked_at < CATALOG_VERSION_CHECK_INTERVAL):
+            return
+        version = self._get_version()
+        with self._lock:
+            if version != self._version:
+                self.build()
+                self._version = version
+            self._checked_at = now
+
+    @property
+    def version(self):
+        """Возвращает метку версии справочника, общую для всех процессов."""
+        return self._get_version()
+
+    def build(self):
+        """Заполняет справочник данными из базы данных."""
+        raise NotImplementedError
+
+    def _reset(self):
+        """Сбрасывает справочник в текущем процессе."""
+        with self._lock:
+            self._version = None
+            self._checked_at = None
+
+    def invalidate(self):
+        """Сбрасывает справочник во всех процессах."""
+        caches['stamps'].set(self.version_key, uuid4().hex, None)
+        self._reset()
+
+
+class TagCatalog(Catalog):
+    """Справочник тегов: id -> тег, слаг -> id."""
+    version_key = 'catalog:tags:version'
+
+    def __init__(self):
+        super().__init__()
+        self._by_id = {}
+        self._by_slug = {}
+
+    def build(self):
+        # Поля совпадают с выводом TagSerializer.
+        tags = Tag.objects.order_by('id').values('id', 'name', 'slug')
+        self._by_id = {tag['id']: tag for tag in tags}
+        self._by_slug = {
+            tag['slug']: tag['id'] for tag in self._by_id.values()
+        }
+
+    def all(self):
+        """Возвращает список всех тегов."""
+        self._load()
+        return [dict(tag) for tag in self._by_id.values()]
+
+    def get(self, tag_id):
+        """Возвращает тег по id или None, если тег не найден."""
+        self._load()
+        tag = self._by_id.get(tag_id)
+        return dict(tag) if tag is not None else None
+
+    def get_many(self, tag_ids):
+        """Возвращает теги по списку id с сохранением порядка."""
+        self._load()
+        if any(tag_id not in self._by_id for tag_id in tag_ids):
+            self._reset()
+            self._load()
+        return [
+            dict(self._by_id[tag_id])
+            for tag_id in tag_ids if tag_id in self._by_id
+        ]
+
+    def slugs(self):
+        """Возвращает варианты выбора тегов по слагу."""
+        self._load()
+        return [(slug, slug) for slug in self._by_slug]
+
+    def ids_by_slugs(self, slugs):
+        """Возвращает id тегов по списку слагов."""
+        self._load()
+        return [
+            self._by_slug[slug] for slug in slugs if slug in self._by_slug
+        ]
+
+
+class IngredientCatalog(Catalog):
+    """Поисковый индекс ингредиентов по названию.
+
+    Хранит ингредиенты, отсортированные по названию в нижнем регистре:
+    совпадения по началу названия находятся двоичным поиском, совпадения
+    по подстроке - просмотром списка. Если ингредиентов больше
+    INGREDIENT_INDEX_MAX_SIZE, индекс отключается и поиск выполняется
+    в базе данных."""
+    version_key = 'catalog:ingredients:version'
+
+    def __init__(self):
+        super().__init__()
+        self._index = ([], [])
+        self._enabled = False
+
+    def build(self):
+        # Поля совпадают с выводом IngredientSerializer.
+        ingredients = list(Ingredient.objects.order_by('id').values(
+            'id', 'name', 'measurement_unit'
+        )[:INGREDIENT_INDEX_MAX_SIZE + 1])
+        self._enabled = len(ingredients) <= INGREDIENT_INDEX_MAX_SIZE
+        if not self._enabled:
+            ingredients = []
+        ingredients.sort(key=lambda item: (item['name'].lower(), item['id']))
+        self._index = (
+            [item['name'].lower() for item in ingredients], ingredients
+        )
+
+    @property
+    def enabled(self):
+        """Возвращает признак того, что поиск выполняется по индексу."""
+        self._load()
+        return self._enabled
+
+    def search(self, value, limit):
+        """Возвращает ингредиенты, название которых начинается со строки
+        поиска, а затем ингредиенты, название которых ее содержит."""
+        self._load()
+        value = value.lower()
+        names, ingredients = self._index
+        start = end = bisect_left(names, value)
+        while (end < len(names) and end - start < limit
+               and names[end].startswith(value)):
+            end += 1
+        result = ingredients[start:end]
+        for index, name in enumerate(names):
+            if len(result) >= limit:
+                break
+            if not start <= index < end and value in name:
+                result.append(ingredients[index])
+        return [dict(ingredient) for ingredient in result]
+
+
+class ShortLinkCache(Catalog):
+    """LRU-кэш id рецептов по кодам коротких ссылок с ограниченным временем
+    жизни записей. Хранит и отсутствие ссылки с кодом (значение None).
+    Сбрасывается во всех процессах при удалении ссылок, в том числе
+    при удалении рецепта. При создании ссылки в общем кэше сохраняется
+    отметка для ее кода, по которой процессы отбрасывают запись
+    об отсутствии ссылки."""
+    version_key = 'catalog:short_links:version'
+    created_key = 'short_link:created:{}'
+
+    def __init__(self, maxsize):
+        super().__init__()
+        self.maxsize = maxsize
+        self._items = OrderedDict()
+
+    def build(self):
+        self._items = OrderedDict()
+
+    def get(self, code):
+        """Возвращает пару: признак наличия записи в кэше и id рецепта."""
+        self._load()
+        with self._lock:
+            item = self._items.get(code)
+            if item is None:
+                return False, None
+            recipe_id, expires_at = item
+            if expires_at > monotonic():
+                self._items.move_to_end(code)
+            else:
+                del self._items[code]
+                return False, None
+        if recipe_id is None and cache.get(self.created_key.format(code)):
+            self.discard(code)
+            return False, None
+        return True, recipe_id
+
+    def set(self, code, recipe_id, timeout):
+        """Сохраняет id рецепта для кода на timeout секунд."""
+        with self._lock:
+            self._items[code] = (recipe_id, monotonic() + timeout)
+            self._items.move_to_end(code)
+            while len(self._items) > self.maxsize:
+                self._items.popitem(last=False)
+
+    def discard(self, code):
+        """Удаляет запись для кода в текущем процессе."""
+        with self._lock:
+            self._items.pop(code, None)
+
+    def created(self, code):
+        """Отмечает создание ссылки с кодом. Отметка хранится, пока могут
+        существовать записи об отсутствии ссылки, сделанные до ее
+        создания."""
+        cache.set(
+            self.created_key.format(code), True,
+            SHORT_LINK_NOT_FOUND_CACHE_TIMEOUT
+        )
+        self.discard(code)
+
+
+tag_catalog = TagCatalog()
+ingredient_catalog = IngredientCatalog()
+short_link_cache = ShortLinkCache(SHORT_LINK_CACHE_SIZE)
@@ -1,8 +1,16 @@
+from django.db.models import Case, IntegerField, Value, When
 from django_filters.rest_framework import (CharFilter, FilterSet,
-                                           ModelMultipleChoiceFilter)
+                                           MultipleChoiceFilter)
 from rest_framework.filters import BaseFilterBackend
 
-from recipes.models import Tag
+from backend.constants import INGREDIENT_SEARCH_LIMIT
+
+from .catalog import tag_catalog
+
+
+def get_tag_choices():
+    """Возвращает варианты выбора тегов из справочника тегов."""
+    return tag_catalog.slugs()
 
 
 class FavoriteShoppingCartFilter(BaseFilterBackend):
@@ -16,28 +24,50 @@ class FavoriteShoppingCartFilter(BaseFilterBackend):
         if holder.is_anonymous:
             return queryset
         if favorite:
-            favorite_objects = holder.favorites.all()
-            favorite_recipes = [obj.recipe for obj in favorite_objects]
-            return favorite_recipes
+            return queryset.filter(favorites__holder=holder)
         if shopping_cart:
-            shopping_cart_objects = holder.shopping_cart.all()
-            shopping_cart_recipes = [
-                obj.recipe for obj in shopping_cart_objects
-            ]
-            return shopping_cart_recipes
+            return queryset.filter(shopping_cart__holder=holder)
         return queryset
 
 
+def get_search_limit(request):
+    """Возвращает максимальное количество результатов поиска."""
+    try:
+        limit = int(request.query_params.get('limit'))
+    except (TypeError, ValueError):
+        return INGREDIENT_SEARCH_LIMIT
+    return min(max(limit, 1), INGREDIENT_SEARCH_LIMIT)
+
+
 class IngredientFilter(FilterSet):
-    """Фильтр для вывода списка игредиентов по имени."""
-    name = CharFilter(lookup_expr='icontains')
+    """Фильтр для вывода списка игредиентов по имени: сначала ингредиенты,
+    название которых начинается со строки поиска, затем ингредиенты,
+    название которых ее содержит."""
+    name = CharFilter(method='filter_name')
+
+    def filter_name(self, queryset, name, value):
+        """Ранжирует и ограничивает найденные ингредиенты."""
+        return queryset.filter(name__icontains=value).annotate(
+            rank=Case(
+                When(name__istartswith=value, then=Value(0)),
+                default=Value(1),
+                output_field=IntegerField()
+            )
+        ).order_by('rank', 'name')[:get_search_limit(self.request)]
 
 
 class RecipeFilter(FilterSet):
     """Фильтр для вывода списка рецептов по автору и тегам."""
     author = CharFilter(field_name='author__id')
-    tags = ModelMultipleChoiceFilter(
-        queryset=Tag.objects.all(),
-        field_name='tags__slug',
-        to_field_name='slug'
+    tags = MultipleChoiceFilter(
+        choices=get_tag_choices,
+        method='filter_tags'
     )
+
+    def filter_tags(self, queryset, name, value):
+        """Фильтрует рецепты по слагам тегов из справочника тегов."""
+        if not value:
+            return queryset
+        return queryset.filter(
+            tags__id__in=tag_catalog.ids_by_slugs(value)
+        ).distinct()
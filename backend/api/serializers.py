@@ -1,11 +1,14 @@
-from rest_framework.serializers import (ModelSerializer,
-                                        PrimaryKeyRelatedField,
-                                        SerializerMethodField,
+from django.db import transaction
+from django.urls import reverse
+from rest_framework.serializers import (ModelSerializer, SerializerMethodField,
                                         SlugRelatedField, ValidationError)
 
-from backend.utils import Base64ImageField
+from backend.utils import (Base64ImageField, PrimaryKeyField, bump_generation,
+                           update_shopping_cart_ingredients)
 from recipes.models import Ingredient, Link, Recipe, RecipeIngredient, Tag
-from users.serializers import UserSerializer
+from users.serializers import SubscriptionListSerializer, UserSerializer
+
+from .catalog import tag_catalog
 
 
 class TagSerializer(ModelSerializer):
@@ -24,7 +27,7 @@ class IngredientSerializer(ModelSerializer):
 
 class RecipeIngredientSerializer(ModelSerializer):
     """Сериализатор для модели RecipeIngredient."""
-    id = PrimaryKeyRelatedField(
+    id = PrimaryKeyField(
         source='ingredient', queryset=Ingredient.objects.all()
     )
     name = SlugRelatedField(
@@ -61,12 +64,14 @@ class RecipeSerializer(ModelSerializer):
     ingredients = RecipeIngredientSerializer(
         source='recipeingredients', many=True
     )
-    tags = PrimaryKeyRelatedField(
+    tags = PrimaryKeyField(
         queryset=Tag.objects.all(), many=True
     )
+    subscription_user_field = 'author_id'
 
     class Meta:
         model = Recipe
+        list_serializer_class = SubscriptionListSerializer
         fields = (
             'id',
             'tags',
@@ -80,49 +85,76 @@ class RecipeSerializer(ModelSerializer):
             'cooking_time',
         )
 
+    def get_user_flag(self, obj, field, related_name):
+        """Возвращает признак связи рецепта с текущим пользователем.
+        Значение берется из аннотации queryset, если она есть,
+        иначе выполняется отдельный запрос."""
+        if hasattr(obj, field):
+            return getattr(obj, field)
+        user = self.context.get('request').user
+        return (not user.is_anonymous
+                and getattr(obj, related_name).filter(holder=user).exists())
+
     def get_is_favorited(self, obj):
         """Формирует данные для поля is_favorited."""
-        user = self.context.get('request').user
-        return True if not user.is_anonymous and obj.favorites.filter(
-            holder=user, recipe=obj).exists() else False
+        return self.get_user_flag(obj, 'is_favorited', 'favorites')
 
     def get_is_in_shopping_cart(self, obj):
         """Формирует данные для поля is_in_shopping_cart."""
-        user = self.context.get('request').user
-        return True if not user.is_anonymous and obj.shopping_cart.filter(
-            holder=user, recipe=obj).exists() else False
+        return self.get_user_flag(
+            obj, 'is_in_shopping_cart', 'shopping_cart'
+        )
 
     def to_representation(self, instance):
-        """Изменяет вывод данных для поля ingredients рецепта."""
+        """Изменяет вывод данных для поля tags рецепта."""
         data = super().to_representation(instance)
-        tags = data.get('tags')
-        data['tags'] = []
-        for tag_id in tags:
-            tag_obj = Tag.objects.get(id=tag_id)
-            data['tags'].append(TagSerializer(tag_obj).data)
+        data['tags'] = tag_catalog.get_many(data['tags'])
         return data
 
-    def check_empty_repeat(self, items, field):
-        """Проверяет, что список элементов поля не пустой,
-        и не содержит повторяющиеся элементы."""
+    def check_empty_repeat(self, items):
+        """Возвращает ошибку, если список элементов поля пустой
+        или содержит повторяющиеся элементы."""
         if not len(items):
-            raise ValidationError({field: 'Поле не должно быть пустым.'})
-        item_list = set()
-        for item in items:
-            item_list.add(item)
-        if len(items) != len(item_list):
-            raise ValidationError({field: 'Повторы не допустимы.'})
+            return 'Поле не должно быть пустым.'
+        if len(items) != len(set(items)):
+            return 'Повторы не допустимы.'
+        return None
+
+    def get_objects(self, model, ids):
+        """Загружает объекты по списку id одним запросом. Возвращает
+        объекты и ошибку, в которой перечислены все несуществующие id."""
+        objects = model.objects.in_bulk(ids)
+        missing = [str(pk) for pk in ids if pk not in objects]
+        if missing:
+            return objects, (
+                f'Объекты с id {", ".join(missing)} не существуют.'
+            )
+        return objects, None
 
     def validate(self, attrs):
         """Проверяет соответствие данных полуй tags и ingredients
-        требованиями проекта."""
+        требованиями проекта. Ошибки обоих полей возвращаются вместе."""
         tags = attrs.get('tags')
-        self.check_empty_repeat(tags, 'tags')
         ingredients = attrs.get('recipeingredients')
         ingredients_list = [
             ingredient.get('ingredient') for ingredient in ingredients
         ]
-        self.check_empty_repeat(ingredients_list, 'ingredients')
+        errors, objects = {}, {}
+        for field, model, ids in (('tags', Tag, tags),
+                                  ('ingredients', Ingredient,
+                                   ingredients_list)):
+            error = self.check_empty_repeat(ids)
+            if error is None:
+                objects[field], error = self.get_objects(model, ids)
+            if error is not None:
+                errors[field] = error
+        if errors:
+            raise ValidationError(errors)
+        attrs['tags'] = [objects['tags'][pk] for pk in tags]
+        for ingredient in ingredients:
+            ingredient['ingredient'] = objects['ingredients'][
+                ingredient['ingredient']
+            ]
         return super().validate(attrs)
 
     def add_ingredients(self, recipe, ingredients):
@@ -136,10 +168,25 @@ class RecipeSerializer(ModelSerializer):
             )
         RecipeIngredient.objects.bulk_create(ingredients_to_add)
 
-    def add_tags(self, recipe, tags):
-        """Добавляет теги в рецепт."""
-        for tag in tags:
-            recipe.tags.add(tag)
+    def add_tags(self, recipe, tags, old_tag_ids=()):
+        """Устанавливает теги рецепта: удаляет лишние связи одним запросом
+        и добавляет недостающие другим. old_tag_ids - id текущих тегов
+        рецепта, например из предзагруженного recipe.tags."""
+        through = Recipe.tags.through
+        tag_ids = {tag.id for tag in tags}
+        old_tag_ids = set(old_tag_ids)
+        if old_tag_ids - tag_ids:
+            through.objects.filter(
+                recipe=recipe, tag_id__in=old_tag_ids - tag_ids
+            ).delete()
+        if tag_ids - old_tag_ids:
+            through.objects.bulk_create(
+                through(recipe=recipe, tag_id=tag_id)
+                for tag_id in tag_ids - old_tag_ids
+            )
+        if tag_ids != old_tag_ids:
+            # bulk_create не отправляет сигналы изменения связей.
+            bump_generation(through)
 
     def create(self, validated_data):
         """Создает объект модели Recipe."""
@@ -160,15 +207,61 @@ class RecipeUpdateSerializer(RecipeSerializer):
     class Meta(RecipeSerializer.Meta):
         pass
 
+    def update_ingredients(self, recipe, ingredients):
+        """Обновляет ингредиенты рецепта: добавляет новые, изменяет
+        количество у измененных и удаляет отсутствующие в запросе.
+        Возвращает прежнее количество каждого ингредиента."""
+        amounts = {
+            ingredient['ingredient'].id: ingredient['amount']
+            for ingredient in ingredients
+        }
+        old_amounts = {}
+        to_update, to_delete = [], []
+        for recipe_ingredient in recipe.recipeingredients.all():
+            ingredient_id = recipe_ingredient.ingredient_id
+            if ingredient_id not in amounts or ingredient_id in old_amounts:
+                to_delete.append(recipe_ingredient.id)
+            elif recipe_ingredient.amount != amounts[ingredient_id]:
+                to_update.append(recipe_ingredient)
+            old_amounts[ingredient_id] = (
+                old_amounts.get(ingredient_id, 0) + recipe_ingredient.amount
+            )
+        for recipe_ingredient in to_update:
+            recipe_ingredient.amount = amounts[recipe_ingredient.ingredient_id]
+        RecipeIngredient.objects.bulk_create(
+            RecipeIngredient(
+                recipe=recipe, ingredient_id=ingredient_id, amount=amount
+            )
+            for ingredient_id, amount in amounts.items()
+            if ingredient_id not in old_amounts
+        )
+        RecipeIngredient.objects.bulk_update(to_update, ('amount',))
+        RecipeIngredient.objects.filter(id__in=to_delete).delete()
+        return old_amounts
+
+    @transaction.atomic
     def update(self, instance, validated_data):
-        """Обновляет объект модели Recipe."""
-        instance.ingredients.clear()
-        instance.tags.clear()
+        """Обновляет объект модели Recipe и суммарные списки покупок
+        пользователей, у которых рецепт находится в списке покупок."""
         ingredients = validated_data.pop('recipeingredients')
         tags = validated_data.pop('tags')
         super().update(instance, validated_data)
-        self.add_ingredients(instance, ingredients)
-        self.add_tags(instance, tags)
+        old_amounts = self.update_ingredients(instance, ingredients)
+        self.add_tags(
+            instance, tags, [tag.id for tag in instance.tags.all()]
+        )
+        new_amounts = {
+            ingredient['ingredient'].id: ingredient['amount']
+            for ingredient in ingredients
+        }
+        update_shopping_cart_ingredients(
+            list(instance.shopping_cart.values_list('holder_id', flat=True)),
+            {
+                ingredient_id: (new_amounts.get(ingredient_id, 0)
+                                - old_amounts.get(ingredient_id, 0))
+                for ingredient_id in old_amounts.keys() | new_amounts.keys()
+            }
+        )
         return instance
 
 
@@ -182,10 +275,18 @@ class RecipeActionSerializer(ModelSerializer):
 
 class LinkSerializer(ModelSerializer):
     """Сериализатор для вывода данных при запросе короткой ссылки."""
+    short_link = SerializerMethodField()
+
     class Meta:
         model = Link
         fields = ('short_link',)
 
+    def get_short_link(self, obj):
+        """Формирует полный адрес короткой ссылки для текущего хоста."""
+        return self.context.get('request').build_absolute_uri(
+            reverse('short-link', args=(obj.code,))
+        )
+
     def to_representation(self, instance):
         """Формирует данные для вывода поля short-link."""
         data = super().to_representation(instance)
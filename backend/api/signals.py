@@ -0,0 +1,89 @@
+from django.contrib.auth import get_user_model
+from django.db.models.signals import (m2m_changed, post_delete, post_save,
+                                      pre_delete)
+from django.dispatch import receiver
+
+from backend.utils import (bump_generation, get_recipe_amounts,
+                           update_shopping_cart_ingredients)
+from recipes.models import (Favorite, Ingredient, Link, Recipe,
+                            RecipeIngredient, ShoppingCart, Tag)
+from users.models import Subscription
+
+from .catalog import ingredient_catalog, short_link_cache, tag_catalog
+
+User = get_user_model()
+
+# Модели, таблицы которых входят в запросы списков с сохраненным
+# количеством объектов и в кэш ответов. Обработчики сигналов отключают
+# быстрое удаление в Django, поэтому подключаются только к этим моделям.
+GENERATION_MODELS = (Recipe, RecipeIngredient, Tag, Ingredient, User,
+                     Favorite, ShoppingCart, Subscription)
+
+
+def bump_model_generation(sender, update_fields=None, **kwargs):
+    """Меняет метку версии таблицы при изменении объектов модели.
+    От метки зависят сохраненное количество объектов списков и кэш
+    ответов. Обновление только даты входа пользователя не учитывается."""
+    if update_fields is not None and set(update_fields) == {'last_login'}:
+        return
+    bump_generation(sender)
+
+
+for model in GENERATION_MODELS:
+    post_save.connect(bump_model_generation, sender=model)
+    post_delete.connect(bump_model_generation, sender=model)
+
+
+@receiver(m2m_changed, sender=Recipe.tags.through)
+def bump_relation_generation(sender, action, **kwargs):
+    """Меняет метку версии таблицы тегов рецептов."""
+    if action.startswith('post_'):
+        bump_generation(sender)
+
+
+@receiver((post_save, post_delete), sender=Tag)
+def invalidate_tag_catalog(sender, **kwargs):
+    """Сбрасывает справочник тегов при изменении тегов."""
+    tag_catalog.invalidate()
+
+
+@receiver((post_save, post_delete), sender=Ingredient)
+def invalidate_ingredient_catalog(sender, **kwargs):
+    """Сбрасывает поисковый индекс ингредиентов
+    при изменении ингредиентов."""
+    ingredient_catalog.invalidate()
+
+
+@receiver(post_save, sender=Link)
+def mark_short_link_created(sender, instance, created, **kwargs):
+    """Отбрасывает запись об отсутствии ссылки с кодом новой ссылки."""
+    if created:
+        short_link_cache.created(instance.code)
+
+
+@receiver(post_delete, sender=Link)
+def invalidate_short_link_cache(sender, **kwargs):
+    """Сбрасывает кэш коротких ссылок при удалении ссылок, в том числе
+    каскадном при удалении рецепта."""
+    short_link_cache.invalidate()
+
+
+@receiver(post_save, sender=ShoppingCart)
+def add_shopping_cart_ingredients(sender, instance, created, **kwargs):
+    """Добавляет ингредиенты рецепта в суммарный список покупок."""
+    if created:
+        update_shopping_cart_ingredients(
+            [instance.holder_id], get_recipe_amounts(instance.recipe_id)
+        )
+
+
+@receiver(pre_delete, sender=ShoppingCart)
+def remove_shopping_cart_ingredients(sender, instance, **kwargs):
+    """Вычитает ингредиенты рецепта из суммарного списка покупок."""
+    update_shopping_cart_ingredients(
+        [instance.holder_id],
+        {
+            ingredient_id: -amount for ingredient_id, amount
+            in get_recipe_amounts(instance.recipe_id).items()
+        }
+    )
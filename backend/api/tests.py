@@ -0,0 +1,157 @@
+import logging
+
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.core.cache import caches
+from django.db import connection
+from django.test import override_settings
+from django.urls import reverse
+from rest_framework.authtoken.models import Token
+from rest_framework.test import APIClient, APITestCase
+
+from recipes.models import (Favorite, Ingredient, Recipe, RecipeIngredient,
+                            ShoppingCart, Tag)
+from users.models import Subscription
+
+User = get_user_model()
+
+RECIPES_COUNT = 60
+PAGE_SIZES = (6, 50)
+# Для списка без условий на PostgreSQL пагинатор сначала запрашивает
+# оценку количества строк по статистике таблицы.
+ESTIMATE_QUERIES = 1 if connection.vendor == 'postgresql' else 0
+# Кэши тестов хранятся в памяти процесса и не затрагивают кэши
+# запущенного на той же машине сервера.
+TEST_CACHES = {
+    alias: {
+        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+        'LOCATION': f'tests-{alias}',
+        'OPTIONS': {'MAX_ENTRIES': 10 ** 9},
+    }
+    for alias in settings.CACHES
+}
+
+
+@override_settings(CACHES=TEST_CACHES)
+class RecipeQueryBudgetTests(APITestCase):
+    """Количество запросов к базе данных при выводе рецептов не зависит
+    от количества рецептов на странице."""
+    # Количество, страница, теги и ингредиенты рецептов страницы.
+    anonymous_list_queries = 4 + ESTIMATE_QUERIES
+    # Плюс токен и подписки на авторов.
+    authenticated_list_queries = 6 + ESTIMATE_QUERIES
+    # Рецепт, его теги и ингредиенты.
+    anonymous_detail_queries = 3
+    # Плюс токен и подписка на автора.
+    authenticated_detail_queries = 5
+
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        # Показатели каждого запроса не выводятся в журнал тестов.
+        logger = logging.getLogger('backend')
+        cls.addClassCleanup(logger.setLevel, logger.level)
+        logger.setLevel(logging.CRITICAL)
+
+    @classmethod
+    def setUpTestData(cls):
+        authors = [
+            User.objects.create_user(
+                username=f'author{number}',
+                email=f'author{number}@example.com',
+                password='password',
+                first_name='Имя',
+                last_name='Фамилия'
+            )
+            for number in range(5)
+        ]
+        cls.user = authors[0]
+        tags = [
+            Tag.objects.create(name=f'Тег {number}', slug=f'tag{number}')
+            for number in range(3)
+        ]
+        ingredients = [
+            Ingredient.objects.create(
+                name=f'Ингредиент {number}', measurement_unit='г'
+            )
+            for number in range(10)
+        ]
+        recipes = [
+            Recipe.objects.create(
+                name=f'Рецепт {number}',
+                text='Описание',
+                cooking_time=10,
+                image='recipes/images/test.png',
+                author=authors[number % len(authors)]
+            )
+            for number in range(RECIPES_COUNT)
+        ]
+        cls.recipe = recipes[0]
+        Recipe.tags.through.objects.bulk_create(
+            Recipe.tags.through(recipe=recipe, tag=tag)
+            for number, recipe in enumerate(recipes)
+            for tag in tags[:number % len(tags) + 1]
+        )
+        RecipeIngredient.objects.bulk_create(
+            RecipeIngredient(
+                recipe=recipe,
+                ingredient=ingredients[(number + shift) % len(ingredients)],
+                amount=shift + 1
+            )
+            for number, recipe in enumerate(recipes)
+            for shift in range(4)
+        )
+        for recipe in recipes[::3]:
+            Favorite.objects.create(holder=cls.user, recipe=recipe)
+        for recipe in recipes[::5]:
+            ShoppingCart.objects.create(holder=cls.user, recipe=recipe)
+        for author in authors[1:3]:
+            Subscription.objects.create(user=cls.user, subscribed_on=author)
+
+    def setUp(self):
+        self.anonymous = APIClient()
+        self.authenticated = APIClient()
+        self.authenticated.credentials(
+            HTTP_AUTHORIZATION='Token '
+            + Token.objects.create(user=self.user).key
+        )
+
+    def assert_queries(self, client, url, number):
+        """Проверяет количество запросов при выводе ответа. Первый запрос
+        загружает справочники, ответ из кэша ответов не учитывается."""
+        client.get(url)
+        for alias in settings.CACHES:
+            if alias != 'stamps':
+                caches[alias].clear()
+        with self.assertNumQueries(number):
+            response = client.get(url)
+        self.assertEqual(response.status_code, 200)
+        return response
+
+    def test_list_queries(self):
+        """Количество запросов при выводе списка рецептов одинаково
+        для страниц из 6 и 50 рецептов."""
+        for client, number in (
+            (self.anonymous, self.anonymous_list_queries),
+            (self.authenticated, self.authenticated_list_queries),
+        ):
+            for page_size in PAGE_SIZES:
+                with self.subTest(client=client, page_size=page_size):
+                    response = self.assert_queries(
+                        client,
+                        f'{reverse("recipes-list")}?limit={page_size}',
+                        number
+                    )
+                    self.assertEqual(
+                        len(response.json()['results']), page_size
+                    )
+
+    def test_detail_queries(self):
+        """Количество запросов при выводе рецепта."""
+        url = reverse('recipes-detail', args=(self.recipe.id,))
+        for client, number in (
+            (self.anonymous, self.anonymous_detail_queries),
+            (self.authenticated, self.authenticated_detail_queries),
+        ):
+            with self.subTest(client=client):
+                self.assert_queries(client, url, number)
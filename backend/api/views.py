@@ -1,40 +1,91 @@
-from django.http import FileResponse, HttpResponse
+from django.contrib.auth import get_user_model
+from django.db.models import BooleanField, Exists, OuterRef, Prefetch, Value
+from django.http import HttpResponse, StreamingHttpResponse
 from django.shortcuts import redirect
+from django.utils.cache import patch_cache_control
 from django_filters.rest_framework import DjangoFilterBackend
 from rest_framework import status
 from rest_framework.decorators import action
+from rest_framework.exceptions import NotFound
 from rest_framework.filters import SearchFilter
 from rest_framework.permissions import IsAuthenticated
 from rest_framework.response import Response
 from rest_framework.viewsets import ModelViewSet, ReadOnlyModelViewSet
 
+from backend.constants import (SHOPPING_CART_DEFAULT_FORMAT,
+                               SHOPPING_CART_FORMATS, SHORT_LINK_CACHE_TIMEOUT,
+                               SHORT_LINK_NOT_FOUND_CACHE_TIMEOUT, SYMBOLS)
+from backend.instrumentation import serializer_data
+from backend.mixins import AnonymousCacheMixin, ConditionalGetMixin
 from backend.paginations import Pagination
-from backend.utils import create_shopping_cart, create_short_link
-from recipes.models import (Favorite, Ingredient, Link, Recipe, ShoppingCart,
-                            Tag)
+from backend.utils import (create_shopping_cart, create_short_link_code,
+                           get_shopping_cart_ingredients)
+from recipes.models import (Favorite, Ingredient, Link, Recipe,
+                            RecipeIngredient, ShoppingCart, Tag)
+from users.loaders import get_subscription_loader
 
-from .filters import FavoriteShoppingCartFilter, IngredientFilter, RecipeFilter
+from .catalog import ingredient_catalog, short_link_cache, tag_catalog
+from .filters import (FavoriteShoppingCartFilter, IngredientFilter,
+                      RecipeFilter, get_search_limit)
 from .permissions import IsAuthorOrReadOnly
 from .serializers import (IngredientSerializer, LinkSerializer,
                           RecipeActionSerializer, RecipeSerializer,
                           RecipeUpdateSerializer, TagSerializer)
 
+User = get_user_model()
 
-class TagViewSet(ReadOnlyModelViewSet):
+
+class TagViewSet(ConditionalGetMixin, AnonymousCacheMixin,
+                 ReadOnlyModelViewSet):
     """Представление для работы с тегами."""
     queryset = Tag.objects.all()
     serializer_class = TagSerializer
+    cache_models = (Tag,)
+
+    def get_conditional_state(self, request, *args, **kwargs):
+        """Возвращает версию справочника тегов."""
+        return [tag_catalog.version], None
+
+    def list(self, request, *args, **kwargs):
+        """Возвращает список тегов из справочника тегов."""
+        return Response(tag_catalog.all())
+
+    def retrieve(self, request, *args, **kwargs):
+        """Возвращает тег из справочника тегов."""
+        try:
+            tag = tag_catalog.get(int(kwargs[self.lookup_field]))
+        except ValueError:
+            tag = None
+        if tag is None:
+            raise NotFound
+        return Response(tag)
 
 
-class IngredientViewSet(ReadOnlyModelViewSet):
+class IngredientViewSet(ConditionalGetMixin, AnonymousCacheMixin,
+                        ReadOnlyModelViewSet):
     """Представление для работы с ингредиентами."""
     queryset = Ingredient.objects.all()
     serializer_class = IngredientSerializer
     filter_backends = (DjangoFilterBackend,)
     filterset_class = IngredientFilter
+    cache_models = (Ingredient,)
 
+    def get_conditional_state(self, request, *args, **kwargs):
+        """Возвращает версию справочника ингредиентов."""
+        return [ingredient_catalog.version], None
 
-class RecipeViewSet(ModelViewSet):
+    def list(self, request, *args, **kwargs):
+        """Возвращает список ингредиентов. Поиск по имени выполняется
+        по индексу в памяти, если он доступен."""
+        name = request.query_params.get('name')
+        if name and ingredient_catalog.enabled:
+            return Response(ingredient_catalog.search(
+                name, get_search_limit(request)
+            ))
+        return super().list(request, *args, **kwargs)
+
+
+class RecipeViewSet(ConditionalGetMixin, AnonymousCacheMixin, ModelViewSet):
     """Представление для работы с рецептами."""
     queryset = Recipe.objects.all()
     http_method_names = ('get', 'post', 'patch', 'delete')
@@ -45,10 +96,89 @@ class RecipeViewSet(ModelViewSet):
                        SearchFilter)
     filterset_class = RecipeFilter
     search_fields = ('tags',)
+    cursor_ordering = ('-pub_date', '-id')
+    cache_models = (Recipe, Recipe.tags.through, RecipeIngredient,
+                    Ingredient, Tag, User)
+
+    def get_queryset(self):
+        """Загружает связанные с рецептами объекты и добавляет к ним признаки
+        нахождения в списке избранного и в списке покупок текущего
+        пользователя."""
+        if self.action in ('favorite', 'shopping_cart', 'get_link'):
+            return super().get_queryset()
+        queryset = super().get_queryset().select_related(
+            'author'
+        ).prefetch_related(
+            'tags',
+            Prefetch(
+                'recipeingredients',
+                queryset=RecipeIngredient.objects.select_related('ingredient')
+            )
+        )
+        user = self.request.user
+        if user.is_anonymous:
+            return queryset.annotate(
+                is_favorited=Value(False, output_field=BooleanField()),
+                is_in_shopping_cart=Value(False, output_field=BooleanField())
+            )
+        return queryset.annotate(
+            is_favorited=Exists(Favorite.objects.filter(
+                holder=user, recipe=OuterRef('pk')
+            )),
+            is_in_shopping_cart=Exists(ShoppingCart.objects.filter(
+                holder=user, recipe=OuterRef('pk')
+            ))
+        )
+
+    def get_conditional_state(self, request, *args, **kwargs):
+        """Загружает рецепты ответа и возвращает их состояние: даты
+        изменения рецептов и их авторов, признаки нахождения в избранном
+        и в списке покупок, подписки на автора, а также версии справочников
+        тегов и ингредиентов. Загруженные рецепты и страница используются
+        при выводе ответа, поэтому проверка не добавляет запросов к базе
+        данных. Дата последнего изменения не возвращается: у справочников,
+        от которых зависит ответ, есть только версии."""
+        if self.action == 'retrieve':
+            recipes = [self.get_object()]
+        else:
+            recipes = self.paginate_queryset(
+                self.filter_queryset(self.get_queryset())
+            )
+        self.conditional_recipes = recipes
+        loader = get_subscription_loader(request)
+        loader.prime(recipe.author_id for recipe in recipes)
+        parts = [tag_catalog.version, ingredient_catalog.version]
+        if self.action == 'list':
+            parts.append(self.paginator.get_page_state())
+        parts.append([
+            (recipe.id, recipe.updated_at, recipe.author.updated_at,
+             recipe.is_favorited, recipe.is_in_shopping_cart,
+             loader.is_subscribed(recipe.author_id))
+            for recipe in recipes
+        ])
+        return parts, None
+
+    def list(self, request, *args, **kwargs):
+        """Выводит страницу рецептов, загруженную при проверке
+        состояния."""
+        recipes = getattr(self, 'conditional_recipes', None)
+        if recipes is None:
+            return super().list(request, *args, **kwargs)
+        return self.get_paginated_response(
+            serializer_data(self.get_serializer(recipes, many=True))
+        )
+
+    def retrieve(self, request, *args, **kwargs):
+        """Выводит рецепт, загруженный при проверке состояния."""
+        recipes = getattr(self, 'conditional_recipes', None)
+        if recipes is None:
+            return super().retrieve(request, *args, **kwargs)
+        return Response(serializer_data(self.get_serializer(recipes[0])))
 
     def get_permissions(self):
         """Устанавлиевает разрешения в зависимости от действия."""
-        if self.action in ('create', 'favorite', 'shopping_cart'):
+        if self.action in ('create', 'favorite', 'shopping_cart',
+                           'download_shopping_cart'):
             self.permission_classes = (IsAuthenticated,)
         elif self.action in ('partial_update', 'destroy'):
             self.permission_classes = (IsAuthorOrReadOnly,)
@@ -60,6 +190,22 @@ class RecipeViewSet(ModelViewSet):
             return RecipeUpdateSerializer
         return super().get_serializer_class()
 
+    def perform_create(self, serializer):
+        """Создает рецепт и загружает его для ответа вместе со связанными
+        объектами."""
+        super().perform_create(serializer)
+        serializer.instance = self.get_queryset().get(
+            pk=serializer.instance.pk
+        )
+
+    def perform_update(self, serializer):
+        """Обновляет рецепт и загружает его для ответа вместе
+        со связанными объектами."""
+        super().perform_update(serializer)
+        serializer.instance = self.get_queryset().get(
+            pk=serializer.instance.pk
+        )
+
     def partial_update(self, request, *args, **kwargs):
         """Частично обновляет рецепт."""
         kwargs['partial'] = False
@@ -95,35 +241,66 @@ class RecipeViewSet(ModelViewSet):
 
     @action(('GET',), detail=False)
     def download_shopping_cart(self, request, *args, **kwargs):
-        """Возвращает текстовый файл со списком покупок."""
-        queryset = request.user.shopping_cart.all()
-        recipe_list = [item.recipe for item in queryset]
-        shopping_cart = create_shopping_cart(recipe_list)
-        response = FileResponse(shopping_cart, content_type='application/text')
+        """Возвращает файл со списком покупок в формате txt, csv или json."""
+        file_format = request.query_params.get(
+            'file_format', SHOPPING_CART_DEFAULT_FORMAT
+        )
+        if file_format not in SHOPPING_CART_FORMATS:
+            return Response(
+                {'file_format': 'Допустимые форматы: '
+                 + ', '.join(SHOPPING_CART_FORMATS)},
+                status=status.HTTP_400_BAD_REQUEST
+            )
+        shopping_cart = create_shopping_cart(
+            get_shopping_cart_ingredients(request.user), file_format
+        )
+        response = StreamingHttpResponse(
+            shopping_cart, content_type=SHOPPING_CART_FORMATS[file_format]
+        )
         response['Content-Disposition'] = (
-            'attachment; filename="shopping_cart.txt'
+            f'attachment; filename="shopping_cart.{file_format}"'
         )
         return response
 
     @action(('GET',), detail=True, url_path='get-link')
     def get_link(self, request, *args, **kwargs):
-        """Возвращвает короткую ссылку на рецепт."""
-        request_url = request.build_absolute_uri().replace('get-link/', '')
-        links = Link.objects.filter(url=request_url)
-        if links.exists():
-            links = links.get()
-        else:
-            short_link = create_short_link(request_url)
-            links = Link.objects.create(url=request_url, short_link=short_link)
-        serializer = LinkSerializer(links)
+        """Возвращвает короткую ссылку на рецепт. Ссылки, созданные
+        до перехода на коды из идентификаторов рецептов, сохраняют
+        прежние коды. Если код рецепта уже занят такой ссылкой, к нему
+        добавляется первый символ алфавита: коды из идентификаторов
+        с него не начинаются."""
+        recipe = self.get_object()
+        link = Link.objects.filter(recipe=recipe).first()
+        if link is None:
+            code = create_short_link_code(recipe.id)
+            while Link.objects.filter(code=code).exists():
+                code = SYMBOLS[0] + code
+            link = Link.objects.create(recipe=recipe, code=code)
+        serializer = LinkSerializer(link, context={'request': request})
         return Response(serializer.data, status=status.HTTP_200_OK)
 
 
-def redirection(request):
+def redirection(request, code):
     """Представление для обработки короткой ссылки на рецепт."""
-    request_url = request.build_absolute_uri().replace('get-link/', '')
-    try:
-        links = Link.objects.get(short_link=request_url)
-        return redirect(links.url.replace('api/', ''))
-    except Link.DoesNotExist:
-        return HttpResponse(status=status.HTTP_404_NOT_FOUND)
+    cached, recipe_id = short_link_cache.get(code)
+    if not cached:
+        recipe_id = Link.objects.filter(code=code).values_list(
+            'recipe_id', flat=True
+        ).first()
+        short_link_cache.set(
+            code,
+            recipe_id,
+            SHORT_LINK_NOT_FOUND_CACHE_TIMEOUT if recipe_id is None
+            else SHORT_LINK_CACHE_TIMEOUT
+        )
+    if recipe_id is None:
+        response = HttpResponse(status=status.HTTP_404_NOT_FOUND)
+        patch_cache_control(
+            response, public=True, max_age=SHORT_LINK_NOT_FOUND_CACHE_TIMEOUT
+        )
+        return response
+    response = redirect(f'/recipes/{recipe_id}/')
+    patch_cache_control(
+        response, public=True, max_age=SHORT_LINK_CACHE_TIMEOUT
+    )
+    return response
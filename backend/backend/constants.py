@@ -3,6 +3,20 @@ RECIPE_NAME_LENGTH = 256
 TAG_LENGTH = 32
 INGREDIENT_NAME_LENGTH = 128
 MEASUREMENT_UNIT_LENGTH = 64
+SHOPPING_CART_FORMATS = {
+    'txt': 'text/plain; charset=utf-8',
+    'csv': 'text/csv; charset=utf-8',
+    'json': 'application/json',
+}
+SHOPPING_CART_DEFAULT_FORMAT = 'txt'
+SHORT_LINK_CODE_LENGTH = 16
+PAGINATION_COUNT_CACHE_TIMEOUT = 600
+PAGINATION_EXACT_COUNT_LIMIT = 1000
+PAGINATION_ESTIMATE_MIN_ROWS = 100000
+RESPONSE_CACHE_TIMEOUT = 300
+SHORT_LINK_CACHE_SIZE = 10000
+SHORT_LINK_CACHE_TIMEOUT = 300
+SHORT_LINK_NOT_FOUND_CACHE_TIMEOUT = 60
 SYMBOLS = 'ABCDEFGHIJKLMNOPQRSTUVWXYZabcdefghijklmnopqrstuvwxyz1234567890'
 VALIDE_RECIPE_DATA = {
     'ingredients': [
@@ -18,3 +32,23 @@ VALIDE_RECIPE_DATA = {
     'text': 'description',
     'cooking_time': 20
 }
+CATALOG_VERSION_CHECK_INTERVAL = 1
+INGREDIENT_INDEX_MAX_SIZE = 100000
+INGREDIENT_SEARCH_LIMIT = 50
+INGREDIENT_IMPORT_BATCH_SIZE = 1000
+JSON_READ_CHUNK_SIZE = 65536
+GENERATE_DATA_BATCH_SIZE = 1000
+BENCHMARK_REQUESTS = 20
+BENCHMARK_MAX_REGRESSION = 20
+METRICS_FLUSH_INTERVAL = 1
+METRICS_DURATION_BUCKETS = (
+    0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10
+)
+METRICS_QUERY_BUCKETS = (1, 2, 3, 5, 10, 20, 50, 100)
+PROFILING_HEADER = 'HTTP_X_PROFILE'
+PROFILING_MAX_FILES = 200
+SLOW_QUERY_STACK_DEPTH = 8
+SLOW_QUERY_PARAM_LENGTH = 200
+SLOW_QUERY_REPEAT_INTERVAL = 60
+SLOW_QUERY_SHAPES_LIMIT = 1000
+REPLAY_HTTP_TIMEOUT = 30
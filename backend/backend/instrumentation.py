@@ -0,0 +1,293 @@
+import json
+import logging
+import os
+import re
+import traceback
+from threading import Lock
+from time import monotonic, perf_counter
+
+from django.conf import settings
+from django.db import transaction
+
+from backend.constants import (SLOW_QUERY_PARAM_LENGTH,
+                               SLOW_QUERY_REPEAT_INTERVAL,
+                               SLOW_QUERY_SHAPES_LIMIT, SLOW_QUERY_STACK_DEPTH)
+
+logger = logging.getLogger('backend.requests')
+slow_query_logger = logging.getLogger('backend.slow_queries')
+
+SQL_LITERALS = re.compile(r"'(?:[^']|'')*'|\b\d+(?:\.\d+)?\b")
+SQL_PLACEHOLDER_LISTS = re.compile(r'\((?:\s*(?:%s|\?)\s*,)+\s*(?:%s|\?)\s*\)')
+SQL_SPACES = re.compile(r'\s+')
+# Параметры запросов к этим таблицам и записи паролей не попадают в журнал.
+SENSITIVE_SQL = re.compile(
+    r'authtoken_token|^\s*(?:INSERT|UPDATE)\b.*"password"',
+    re.IGNORECASE | re.DOTALL
+)
+# Кадры самой инструментации не указывают на источник запроса.
+INSTRUMENTATION_FILES = (
+    __file__, os.path.join(os.path.dirname(__file__), 'middleware.py')
+)
+
+
+def describe_view(request, view_func):
+    """Возвращает название представления, действие и имя маршрута,
+    обрабатывающие запрос."""
+    view_class = getattr(view_func, 'cls', None)
+    method = request.method.lower()
+    action = (getattr(view_func, 'actions', None) or {}).get(method, method)
+    url_name = (request.resolver_match.url_name
+                if request.resolver_match is not None else None)
+    return (view_class or view_func).__name__, action, url_name
+
+
+def serializer_data(serializer):
+    """Возвращает данные сериализатора, учитывая время сериализации
+    в показателях запроса из контекста сериализатора."""
+    stats = getattr(serializer.context.get('request'), 'stats', None)
+    if stats is None:
+        return serializer.data
+    start = perf_counter()
+    try:
+        return serializer.data
+    finally:
+        stats.serialize_duration += perf_counter() - start
+
+
+def normalize_sql(sql):
+    """Возвращает форму SQL-запроса без значений: литералы заменяются
+    на ?, списки параметров IN (...) сворачиваются."""
+    sql = SQL_LITERALS.sub('?', sql)
+    sql = SQL_PLACEHOLDER_LISTS.sub('(...)', sql)
+    return SQL_SPACES.sub(' ', sql).strip()
+
+
+def project_stack():
+    """Возвращает последние кадры стека, относящиеся к коду проекта,
+    в виде строк «файл:строка в функции»."""
+    base_dir = str(settings.BASE_DIR) + os.sep
+    frames = [
+        frame for frame in traceback.extract_stack()[:-1]
+        if frame.filename.startswith(base_dir)
+        and 'site-packages' not in frame.filename
+        and frame.filename not in INSTRUMENTATION_FILES
+    ]
+    return [
+        f'{frame.filename[len(base_dir):]}:{frame.lineno} in {frame.name}'
+        for frame in frames[-SLOW_QUERY_STACK_DEPTH:]
+    ]
+
+
+def format_params(sql, params, many):
+    """Возвращает параметры запроса для журнала, обрезая длинные
+    значения и скрывая токены и пароли."""
+    if params is None:
+        return None
+    if SENSITIVE_SQL.search(sql):
+        return 'скрыты'
+    if many:
+        return 'executemany'
+    values = params.values() if isinstance(params, dict) else params
+    return [
+        value if isinstance(value, (int, float, bool)) or value is None
+        else repr(value)[:SLOW_QUERY_PARAM_LENGTH]
+        for value in values
+    ]
+
+
+class SlowQueryLog:
+    """Журнал медленных SQL-запросов.
+
+    Запросы дольше SLOW_QUERY_THRESHOLD миллисекунд записываются в журнал
+    backend.slow_queries с параметрами, временем, стеком вызовов кода
+    проекта и, если включен SLOW_QUERY_EXPLAIN, планом выполнения.
+    Запрос одной формы записывается не чаще раза
+    в SLOW_QUERY_REPEAT_INTERVAL секунд, количество пропущенных
+    повторов указывается в следующей записи."""
+
+    def __init__(self):
+        self._lock = Lock()
+        self._shapes = {}
+
+    def _should_log(self, shape):
+        """Проверяет, нужно ли записать запрос этой формы, и возвращает
+        количество пропущенных повторов."""
+        now = monotonic()
+        with self._lock:
+            if len(self._shapes) >= SLOW_QUERY_SHAPES_LIMIT:
+                self._shapes.clear()
+            logged_at, repeated = self._shapes.get(shape, (None, 0))
+            if (logged_at is not None
+                    and now - logged_at < SLOW_QUERY_REPEAT_INTERVAL):
+                self._shapes[shape] = (logged_at, repeated + 1)
+                return False, repeated
+            self._shapes[shape] = (now, 0)
+            return True, repeated
+
+    def record(self, recorder, sql, params, many, duration, context):
+        """Записывает медленный запрос в журнал."""
+        shape = normalize_sql(sql)
+        should_log, repeated = self._should_log(shape)
+        if not should_log:
+            return
+        entry = {
+            'duration_ms': round(duration * 1000, 2),
+            'sql': sql,
+            'params': format_params(sql, params, many),
+            'shape': shape,
+            'repeated': repeated,
+            'stack': project_stack(),
+        }
+        if (settings.SLOW_QUERY_EXPLAIN and not many
+                and shape.upper().startswith('SELECT')):
+            entry['explain'] = recorder.explain(
+                context['connection'], sql, params
+            )
+        slow_query_logger.warning(json.dumps(
+            entry, ensure_ascii=False, default=str
+        ))
+
+
+slow_query_log = SlowQueryLog()
+
+
+class QueryRecorder:
+    """Обертка выполнения SQL-запросов для connection.execute_wrapper(),
+    считающая количество запросов и их суммарное время и передающая
+    медленные запросы в журнал медленных запросов."""
+
+    def __init__(self):
+        self.count = 0
+        self.duration = 0.0
+        self.explaining = False
+
+    def __call__(self, execute, sql, params, many, context):
+        if self.explaining:
+            return execute(sql, params, many, context)
+        start = perf_counter()
+        try:
+            result = execute(sql, params, many, context)
+        finally:
+            duration = perf_counter() - start
+            self.count += 1
+            self.duration += duration
+        if duration * 1000 >= settings.SLOW_QUERY_THRESHOLD:
+            slow_query_log.record(
+                self, sql, params, many, duration, context
+            )
+        return result
+
+    def explain(self, connection, sql, params):
+        """Возвращает план выполнения запроса. Запрос EXPLAIN выполняется
+        через ту же обертку, поэтому не учитывается и не записывается
+        в журнал повторно. Ошибка EXPLAIN откатывается до точки сохранения
+        и не прерывает текущую транзакцию."""
+        self.explaining = True
+        try:
+            with transaction.atomic(using=connection.alias), \
+                    connection.cursor() as cursor:
+                cursor.execute(
+                    f'{connection.ops.explain_query_prefix()} {sql}', params
+                )
+                return '\n'.join(
+                    ' '.join(str(value) for value in row)
+                    for row in cursor.fetchall()
+                )
+        except Exception as error:
+            return f'EXPLAIN не выполнен: {error}'
+        finally:
+            self.explaining = False
+
+
+class RequestStats:
+    """Показатели обработки одного запроса: представление и действие,
+    количество и время SQL-запросов, время работы представления,
+    сериализации объектов (входит во время представления) и формирования
+    тела ответа в JSON."""
+
+    def __init__(self):
+        self.started = perf_counter()
+        self.queries = QueryRecorder()
+        self.view = None
+        self.action = None
+        self.url_name = None
+        self.view_started = None
+        self.view_finished = None
+        self.serialize_duration = 0.0
+        self.render_started = False
+        self.render_duration = 0.0
+        self.duration = None
+
+    def set_view(self, request, view_func):
+        """Сохраняет представление и действие, обрабатывающие запрос."""
+        self.view, self.action, self.url_name = describe_view(
+            request, view_func
+        )
+        self.view_started = perf_counter()
+
+    def start_render(self, response):
+        """Отмечает окончание работы представления и засекает время
+        формирования тела ответа. Повторный вызов для ответа, тело
+        которого уже сформировано, не учитывается."""
+        if self.render_started:
+            return
+        self.render_started = True
+        self.view_finished = start = perf_counter()
+
+        def rendered(response):
+            self.render_duration = perf_counter() - start
+
+        response.add_post_render_callback(rendered)
+
+    def finish(self):
+        """Отмечает окончание обработки запроса."""
+        now = perf_counter()
+        if self.view_started is not None and self.view_finished is None:
+            self.view_finished = now
+        self.duration = now - self.started
+
+    @property
+    def view_duration(self):
+        if self.view_started is None or self.view_finished is None:
+            return 0.0
+        return self.view_finished - self.view_started
+
+    @property
+    def over_budget(self):
+        """Признак превышения допустимого количества или времени
+        SQL-запросов."""
+        return (self.queries.count > settings.REQUEST_QUERY_BUDGET
+                or self.queries.duration * 1000
+                > settings.REQUEST_SQL_TIME_BUDGET)
+
+    def server_timing(self):
+        """Возвращает значение заголовка Server-Timing."""
+        return ', '.join((
+            f'db;dur={self.queries.duration * 1000:.1f};'
+            f'desc="{self.queries.count} queries"',
+            f'view;dur={self.view_duration * 1000:.1f}',
+            f'serialize;dur={self.serialize_duration * 1000:.1f}',
+            f'render;dur={self.render_duration * 1000:.1f}',
+            f'total;dur={(self.duration or 0) * 1000:.1f}',
+        ))
+
+    def log(self, request, response):
+        """Записывает показатели запроса в журнал одной строкой JSON."""
+        logger.log(
+            logging.WARNING if self.over_budget else logging.INFO,
+            json.dumps({
+                'method': request.method,
+                'path': request.path,
+                'status': response.status_code,
+                'view': self.view,
+                'action': self.action,
+                'url_name': self.url_name,
+                'queries': self.queries.count,
+                'db_ms': round(self.queries.duration * 1000, 2),
+                'view_ms': round(self.view_duration * 1000, 2),
+                'serialize_ms': round(self.serialize_duration * 1000, 2),
+                'render_ms': round(self.render_duration * 1000, 2),
+                'total_ms': round((self.duration or 0) * 1000, 2),
+                'over_budget': self.over_budget,
+            }, ensure_ascii=False)
+        )
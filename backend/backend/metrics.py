@@ -0,0 +1,223 @@
+import atexit
+import json
+import os
+from bisect import bisect_left
+from collections import defaultdict
+from glob import glob
+from ipaddress import ip_address, ip_network
+from threading import Lock
+from time import monotonic
+
+from django.conf import settings
+from django.http import HttpResponse, HttpResponseForbidden
+
+from backend.constants import (METRICS_DURATION_BUCKETS,
+                               METRICS_FLUSH_INTERVAL, METRICS_QUERY_BUCKETS)
+
+PREFIX = 'foodgram'
+LABELS = ('view', 'action')
+
+
+def new_histogram(buckets):
+    """Возвращает пустую гистограмму: счетчики корзин, сумма и количество
+    наблюдений."""
+    return {'buckets': [0] * len(buckets), 'sum': 0, 'count': 0}
+
+
+def observe(histogram, buckets, value):
+    """Добавляет наблюдение в гистограмму."""
+    index = bisect_left(buckets, value)
+    if index < len(buckets):
+        histogram['buckets'][index] += 1
+    histogram['sum'] += value
+    histogram['count'] += 1
+
+
+def merge_histogram(target, source):
+    """Прибавляет значения гистограммы source к target."""
+    for index, value in enumerate(source['buckets']):
+        target['buckets'][index] += value
+    target['sum'] += source['sum']
+    target['count'] += source['count']
+
+
+def format_labels(names, values, **extra):
+    """Возвращает метки в формате Prometheus."""
+    labels = list(zip(names, values)) + list(extra.items())
+    return '{{{}}}'.format(','.join(
+        '{}="{}"'.format(
+            name,
+            str(value).replace('\\', '\\\\').replace('"', '\\"')
+        )
+        for name, value in labels
+    ))
+
+
+class Metrics:
+    """Показатели обработки запросов, общие для всех процессов gunicorn.
+
+    Каждый процесс считает показатели в памяти и не чаще раза
+    в METRICS_FLUSH_INTERVAL секунд записывает их в свой файл
+    METRICS_DIR/<pid>.json. При выдаче показателей файлы всех процессов
+    суммируются. Файлы завершившихся процессов не удаляются, чтобы
+    счетчики не уменьшались при перезапуске рабочих процессов."""
+
+    def __init__(self):
+        self._lock = Lock()
+        self._flushed_at = None
+        self._pid = os.getpid()
+        self._data = self._empty()
+        atexit.register(self.flush)
+
+    @staticmethod
+    def _empty():
+        return {
+            'requests': defaultdict(int),
+            'duration': {},
+            'queries': {},
+            'cache': defaultdict(int),
+        }
+
+    def _check_pid(self):
+        """Сбрасывает показатели, унаследованные от родительского процесса
+        (gunicorn с --preload)."""
+        pid = os.getpid()
+        if pid != self._pid:
+            self._pid = pid
+            self._data = self._empty()
+
+    def record(self, view, action, status, duration, queries, cache=None):
+        """Учитывает обработанный запрос: время в секундах, количество
+        SQL-запросов и результат обращения к кэшу ответов (HIT, MISS)."""
+        key = f'{view}\t{action}'
+        with self._lock:
+            self._check_pid()
+            data = self._data
+            data['requests'][f'{key}\t{status}'] += 1
+            observe(
+                data['duration'].setdefault(
+                    key, new_histogram(METRICS_DURATION_BUCKETS)
+                ),
+                METRICS_DURATION_BUCKETS, duration
+            )
+            observe(
+                data['queries'].setdefault(
+                    key, new_histogram(METRICS_QUERY_BUCKETS)
+                ),
+                METRICS_QUERY_BUCKETS, queries
+            )
+            if cache in ('HIT', 'MISS'):
+                data['cache'][f'{key}\t{cache.lower()}'] += 1
+            if (self._flushed_at is None or monotonic() - self._flushed_at
+                    >= METRICS_FLUSH_INTERVAL):
+                self._flush()
+
+    def _flush(self):
+        """Записывает показатели процесса в файл. Файл заменяется целиком,
+        поэтому читающие процессы не видят его частично записанным."""
+        self._flushed_at = monotonic()
+        directory = settings.METRICS_DIR
+        path = os.path.join(directory, f'{self._pid}.json')
+        try:
+            os.makedirs(directory, exist_ok=True)
+            with open(f'{path}.tmp', 'w', encoding='utf-8') as file:
+                json.dump(self._data, file)
+            os.replace(f'{path}.tmp', path)
+        except OSError:
+            pass
+
+    def flush(self):
+        """Записывает показатели процесса в файл."""
+        with self._lock:
+            self._check_pid()
+            self._flush()
+
+    def collect(self):
+        """Возвращает показатели, суммированные по всем процессам."""
+        self.flush()
+        total = self._empty()
+        for path in glob(os.path.join(settings.METRICS_DIR, '*.json')):
+            try:
+                with open(path, encoding='utf-8') as file:
+                    data = json.load(file)
+            except (OSError, ValueError):
+                continue
+            for name in ('requests', 'cache'):
+                for key, value in data.get(name, {}).items():
+                    total[name][key] += value
+            for name, buckets in (('duration', METRICS_DURATION_BUCKETS),
+                                  ('queries', METRICS_QUERY_BUCKETS)):
+                for key, histogram in data.get(name, {}).items():
+                    if len(histogram['buckets']) != len(buckets):
+                        continue
+                    merge_histogram(
+                        total[name].setdefault(key, new_histogram(buckets)),
+                        histogram
+                    )
+        return total
+
+    def render(self):
+        """Возвращает показатели в текстовом формате Prometheus."""
+        data = self.collect()
+        lines = []
+
+        def header(metric, kind, description):
+            lines.append(f'# HELP {PREFIX}_{metric} {description}')
+            lines.append(f'# TYPE {PREFIX}_{metric} {kind}')
+
+        def sample(metric, names, key, value, **extra):
+            labels = format_labels(names, key.split('\t'), **extra)
+            lines.append(f'{PREFIX}_{metric}{labels} {value}')
+
+        header('requests_total', 'counter', 'Количество запросов.')
+        for key, value in sorted(data['requests'].items()):
+            sample('requests_total', ('view', 'action', 'status'), key, value)
+        for name, metric, buckets, description in (
+            ('duration', 'request_duration_seconds', METRICS_DURATION_BUCKETS,
+             'Время обработки запроса.'),
+            ('queries', 'request_queries', METRICS_QUERY_BUCKETS,
+             'Количество SQL-запросов при обработке запроса.'),
+        ):
+            header(metric, 'histogram', description)
+            for key, histogram in sorted(data[name].items()):
+                cumulative = 0
+                for bound, value in zip(buckets, histogram['buckets']):
+                    cumulative += value
+                    sample(f'{metric}_bucket', LABELS, key, cumulative,
+                           le=f'{bound:g}')
+                sample(f'{metric}_bucket', LABELS, key, histogram['count'],
+                       le='+Inf')
+                sample(f'{metric}_sum', LABELS, key,
+                       round(histogram['sum'], 6))
+                sample(f'{metric}_count', LABELS, key, histogram['count'])
+        header('response_cache_total', 'counter',
+               'Обращения к кэшу ответов анонимным пользователям.')
+        for key, value in sorted(data['cache'].items()):
+            sample('response_cache_total', ('view', 'action', 'result'),
+                   key, value)
+        return '\n'.join(lines) + '\n'
+
+
+metrics = Metrics()
+
+
+def is_allowed(address):
+    """Проверяет, входит ли адрес в METRICS_ALLOWED_IPS."""
+    try:
+        address = ip_address(address)
+    except ValueError:
+        return False
+    return any(
+        address in ip_network(network, strict=False)
+        for network in settings.METRICS_ALLOWED_IPS if network
+    )
+
+
+def metrics_view(request):
+    """Представление, отдающее показатели в формате Prometheus.
+    Доступно только с адресов из METRICS_ALLOWED_IPS."""
+    if not is_allowed(request.META.get('REMOTE_ADDR', '')):
+        return HttpResponseForbidden()
+    return HttpResponse(
+        metrics.render(), content_type='text/plain; version=0.0.4'
+    )
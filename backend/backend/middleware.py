@@ -0,0 +1,106 @@
+from cProfile import Profile
+
+from django.db import connection
+
+from backend.constants import PROFILING_HEADER
+from backend.instrumentation import RequestStats, describe_view
+from backend.metrics import metrics
+from backend.profiling import profiler_lock, save_profile, should_profile
+
+
+class InstrumentationMiddleware:
+    """Промежуточный слой, собирающий показатели обработки запроса.
+
+    Считает SQL-запросы через connection.execute_wrapper(), добавляет
+    в ответ заголовок Server-Timing и записывает показатели в журнал
+    backend.requests. Запросы, превысившие REQUEST_QUERY_BUDGET или
+    REQUEST_SQL_TIME_BUDGET, записываются с уровнем WARNING. Для потоковых
+    ответов запросы, выполненные при передаче тела, учитываются в журнале,
+    но не в заголовке, который отправляется раньше тела. Показатели
+    также учитываются в метриках backend.metrics.
+    Должен быть первым в списке MIDDLEWARE."""
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        stats = RequestStats()
+        request.stats = stats
+        with connection.execute_wrapper(stats.queries):
+            response = self.get_response(request)
+        stats.finish()
+        response['Server-Timing'] = stats.server_timing()
+        if response.streaming:
+            response.streaming_content = self.stream(
+                request, response, response.streaming_content, stats
+            )
+        else:
+            self.finish(request, response, stats)
+        return response
+
+    def stream(self, request, response, content, stats):
+        """Передает тело потокового ответа, учитывая SQL-запросы,
+        выполненные при его формировании."""
+        try:
+            with connection.execute_wrapper(stats.queries):
+                yield from content
+        finally:
+            stats.finish()
+            self.finish(request, response, stats)
+
+    def finish(self, request, response, stats):
+        """Записывает показатели обработанного запроса в журнал
+        и в метрики."""
+        stats.log(request, response)
+        metrics.record(
+            stats.view or 'unresolved', stats.action or '',
+            response.status_code, stats.duration, stats.queries.count,
+            response.get('X-Cache')
+        )
+
+    def process_view(self, request, view_func, view_args, view_kwargs):
+        request.stats.set_view(request, view_func)
+
+    def process_template_response(self, request, response):
+        request.stats.start_render(response)
+        return response
+
+
+class ProfilingMiddleware:
+    """Промежуточный слой, профилирующий обработку запроса с помощью
+    cProfile.
+
+    Профилируются запросы сотрудников с заголовком X-Profile и случайная
+    доля PROFILING_SAMPLE_RATE всех запросов. Профиль сохраняется
+    в PROFILING_DIR. Имя профиля возвращается в заголовке X-Profile-File
+    только сотрудникам, запросившим профилирование заголовком X-Profile.
+    Тело потоковых ответов формируется после профилирования.
+    Должен быть последним в списке MIDDLEWARE."""
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        if not should_profile(request):
+            return self.get_response(request)
+        if not profiler_lock.acquire(blocking=False):
+            return self.get_response(request)
+        try:
+            request.profile_view = (None, None)
+            profiler = Profile()
+            response = profiler.runcall(self.get_response, request)
+            url_name, action = request.profile_view
+            try:
+                name = save_profile(profiler, url_name, action)
+            except OSError:
+                name = None
+            if name is not None and request.META.get(PROFILING_HEADER):
+                response['X-Profile-File'] = name
+        finally:
+            profiler_lock.release()
+        return response
+
+    def process_view(self, request, view_func, view_args, view_kwargs):
+        if hasattr(request, 'profile_view'):
+            _, action, url_name = describe_view(request, view_func)
+            request.profile_view = (url_name, action)
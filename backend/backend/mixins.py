@@ -0,0 +1,148 @@
+from calendar import timegm
+from hashlib import md5
+
+from django.core.cache import caches
+from django.http import HttpResponse
+from django.utils.cache import get_conditional_response, patch_vary_headers
+from django.utils.http import http_date, parse_http_date_safe
+
+from backend.constants import RESPONSE_CACHE_TIMEOUT
+from backend.utils import get_generations
+
+
+class EarlyResponse(Exception):
+    """Исключение, прерывающее обработку запроса готовым ответом."""
+
+    def __init__(self, response):
+        super().__init__()
+        self.response = response
+
+
+class ConditionalGetMixin:
+    """Примесь для представлений, поддерживающая условные GET-запросы
+    (заголовки If-None-Match и If-Modified-Since).
+
+    Представление определяет get_conditional_state(), который возвращает
+    составляющие слабого ETag и дату последнего изменения (или None).
+    Состояние проверяется после аутентификации и проверки разрешений,
+    но до загрузки объектов и сериализации, поэтому ответ 304 не требует
+    полного запроса к базе данных."""
+    conditional_actions = ('list', 'retrieve')
+
+    def get_conditional_state(self, request, *args, **kwargs):
+        """Возвращает пару: список составляющих ETag и дату последнего
+        изменения. Если вернуть None, запрос обрабатывается обычно."""
+        raise NotImplementedError
+
+    def initial(self, request, *args, **kwargs):
+        super().initial(request, *args, **kwargs)
+        self.conditional_headers = None
+        if (request.method not in ('GET', 'HEAD')
+                or self.action not in self.conditional_actions):
+            return
+        state = self.get_conditional_state(request, *args, **kwargs)
+        if state is None:
+            return
+        parts, last_modified = state
+        etag = 'W/"{}"'.format(md5(repr(parts).encode()).hexdigest())
+        if last_modified is not None:
+            last_modified = timegm(last_modified.utctimetuple())
+        self.conditional_headers = (etag, last_modified)
+        response = get_conditional_response(
+            request, etag=etag, last_modified=last_modified
+        )
+        if response is not None:
+            raise EarlyResponse(response)
+
+    def handle_exception(self, exc):
+        if isinstance(exc, EarlyResponse):
+            return exc.response
+        return super().handle_exception(exc)
+
+    def finalize_response(self, request, response, *args, **kwargs):
+        headers = getattr(self, 'conditional_headers', None)
+        if headers is not None and response.status_code in (200, 304):
+            etag, last_modified = headers
+            response['ETag'] = etag
+            if last_modified is not None:
+                response['Last-Modified'] = http_date(last_modified)
+            patch_vary_headers(response, ('Authorization',))
+        return super().finalize_response(request, response, *args, **kwargs)
+
+
+class AnonymousCacheMixin:
+    """Примесь для представлений, сохраняющая в общем кэше responses
+    ответы на GET-запросы анонимных пользователей.
+
+    Ключ строится по адресу запроса с упорядоченными параметрами, формату
+    ответа и меткам версий таблиц моделей cache_models, поэтому изменение
+    любой из этих моделей делает сохраненные ответы недоступными.
+    Заголовок X-Cache сообщает, взят ли ответ из кэша (HIT) или нет (MISS).
+    Примесь указывается после ConditionalGetMixin, чтобы ответ из кэша
+    возвращался без запроса состояния объектов."""
+    cache_actions = ('list', 'retrieve')
+    cache_models = ()
+
+    def get_response_cache_key(self, request):
+        """Возвращает ключ кэша ответа на запрос."""
+        params = sorted(
+            (key, sorted(values))
+            for key, values in request.query_params.lists()
+        )
+        generations = get_generations(
+            model._meta.db_table for model in self.cache_models
+        )
+        return 'response:' + md5(repr((
+            request.get_host(), request.path,
+            request.accepted_renderer.format, params, generations
+        )).encode()).hexdigest()
+
+    def initial(self, request, *args, **kwargs):
+        super().initial(request, *args, **kwargs)
+        self.response_cache_key = None
+        if (request.method != 'GET' or not request.user.is_anonymous
+                or self.action not in self.cache_actions):
+            return
+        self.response_cache_key = self.get_response_cache_key(request)
+        cached = caches['responses'].get(self.response_cache_key)
+        if cached is None:
+            return
+        self.response_cache_key = None
+        status, headers, content = cached
+        response = HttpResponse(content, status=status)
+        for header, value in headers:
+            response[header] = value
+        last_modified = response.get('Last-Modified')
+        response = get_conditional_response(
+            request,
+            etag=response.get('ETag'),
+            last_modified=(parse_http_date_safe(last_modified)
+                           if last_modified else None),
+            response=response
+        )
+        response['X-Cache'] = 'HIT'
+        raise EarlyResponse(response)
+
+    def handle_exception(self, exc):
+        if isinstance(exc, EarlyResponse):
+            return exc.response
+        return super().handle_exception(exc)
+
+    def finalize_response(self, request, response, *args, **kwargs):
+        response = super().finalize_response(
+            request, response, *args, **kwargs
+        )
+        key = getattr(self, 'response_cache_key', None)
+        if key is not None and response.status_code == 200:
+            stats = getattr(request, 'stats', None)
+            if stats is not None:
+                stats.start_render(response)
+            response.render()
+            caches['responses'].set(
+                key,
+                (response.status_code, list(response.items()),
+                 response.content),
+                RESPONSE_CACHE_TIMEOUT
+            )
+            response['X-Cache'] = 'MISS'
+        return response
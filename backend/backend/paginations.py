@@ -1,7 +1,195 @@
+import json
+from base64 import urlsafe_b64decode, urlsafe_b64encode
+from functools import reduce
+from hashlib import md5
+from operator import or_
+
+from django.core.cache import cache
+from django.core.exceptions import EmptyResultSet
+from django.core.paginator import Paginator
+from django.db import connections
+from django.db.models import Q, QuerySet
+from django.utils.functional import cached_property
+from rest_framework.exceptions import NotFound
 from rest_framework.pagination import PageNumberPagination
+from rest_framework.response import Response
+from rest_framework.utils.urls import replace_query_param
+
+from backend.constants import (PAGINATION_COUNT_CACHE_TIMEOUT,
+                               PAGINATION_ESTIMATE_MIN_ROWS,
+                               PAGINATION_EXACT_COUNT_LIMIT)
+from backend.utils import get_generations
+
+
+class CountStrategyPaginator(Paginator):
+    """Пагинатор, выбирающий способ подсчета количества объектов.
+
+    Для запросов без условий к большим таблицам PostgreSQL используется
+    оценка планировщика (estimate). Если количество не больше
+    PAGINATION_EXACT_COUNT_LIMIT, оно считается запросом с ограничением
+    (exact). Иначе количество сохраняется в кэше для набора фильтров
+    (cached) и сбрасывается при изменении таблиц, участвующих в запросе.
+    Выбранный способ сохраняется в атрибуте count_strategy."""
+    count_strategy = None
+
+    @cached_property
+    def count(self):
+        if not isinstance(self.object_list, QuerySet):
+            self.count_strategy = 'exact'
+            return super().count
+        queryset = self.object_list.order_by().values('pk')
+        query = queryset.query
+        try:
+            sql, params = query.sql_with_params()
+        except EmptyResultSet:
+            self.count_strategy = 'exact'
+            return 0
+        if not query.where and not query.distinct:
+            estimate = self.get_estimate(queryset)
+            if estimate >= PAGINATION_ESTIMATE_MIN_ROWS:
+                self.count_strategy = 'estimate'
+                return estimate
+        tables = {join.table_name for join in query.alias_map.values()}
+        key = 'pagination:count:' + md5(
+            f'{sql}{params}{get_generations(tables)}'.encode()
+        ).hexdigest()
+        count = cache.get(key)
+        if count is not None:
+            self.count_strategy = 'cached'
+            return count
+        count = queryset[:PAGINATION_EXACT_COUNT_LIMIT + 1].count()
+        if count <= PAGINATION_EXACT_COUNT_LIMIT:
+            self.count_strategy = 'exact'
+            return count
+        count = queryset.count()
+        cache.set(key, count, PAGINATION_COUNT_CACHE_TIMEOUT)
+        self.count_strategy = 'cached'
+        return count
+
+    def get_estimate(self, queryset):
+        """Возвращает оценку количества строк таблицы по статистике
+        PostgreSQL или -1, если оценка недоступна."""
+        connection = connections[queryset.db]
+        if connection.vendor != 'postgresql':
+            return -1
+        with connection.cursor() as cursor:
+            cursor.execute(
+                'SELECT reltuples::bigint FROM pg_class '
+                'WHERE oid = %s::regclass',
+                [queryset.model._meta.db_table]
+            )
+            row = cursor.fetchone()
+        return row[0] if row is not None else -1
 
 
 class Pagination(PageNumberPagination):
-    """Класс пагинации для вывода списка пользователей и списка рецептов."""
+    """Класс пагинации для вывода списка пользователей и списка рецептов.
+
+    По умолчанию используется постраничная пагинация. Если в запросе
+    передан параметр cursor (в том числе пустой), используется пагинация
+    по ключу: следующая страница начинается после последнего объекта
+    предыдущей в порядке cursor_ordering представления."""
     page_size = 6
     page_size_query_param = 'limit'
+    cursor_query_param = 'cursor'
+    django_paginator_class = CountStrategyPaginator
+
+    def paginate_queryset(self, queryset, request, view=None):
+        self.cursor_ordering = getattr(view, 'cursor_ordering', None)
+        self.use_cursor = (
+            self.cursor_ordering is not None
+            and self.cursor_query_param in request.query_params
+        )
+        if not self.use_cursor:
+            return super().paginate_queryset(queryset, request, view)
+        self.request = request
+        page_size = self.get_page_size(request)
+        queryset = queryset.order_by(*self.cursor_ordering)
+        position = self.decode_cursor(request, queryset.model)
+        if position is not None:
+            queryset = queryset.filter(self.get_cursor_filter(position))
+        page = list(queryset[:page_size + 1])
+        self.has_next = len(page) > page_size
+        self.page = page[:page_size]
+        return self.page
+
+    def get_page_state(self):
+        """Возвращает данные страницы, от которых помимо самих объектов
+        зависит ответ: количество объектов или наличие следующей страницы."""
+        if self.use_cursor:
+            return self.has_next
+        return self.page.paginator.count
+
+    def get_cursor_filter(self, position):
+        """Возвращает условие отбора объектов, следующих за позицией."""
+        conditions = []
+        for index, field in enumerate(self.cursor_ordering):
+            name = field.lstrip('-')
+            lookup = 'lt' if field.startswith('-') else 'gt'
+            equal = {
+                previous.lstrip('-'): position[previous.lstrip('-')]
+                for previous in self.cursor_ordering[:index]
+            }
+            conditions.append(
+                Q(**equal, **{f'{name}__{lookup}': position[name]})
+            )
+        return reduce(or_, conditions)
+
+    def decode_cursor(self, request, model):
+        """Возвращает позицию из параметра cursor."""
+        cursor = request.query_params.get(self.cursor_query_param)
+        if not cursor:
+            return None
+        try:
+            values = json.loads(urlsafe_b64decode(cursor.encode()))
+            return {
+                field.lstrip('-'): model._meta.get_field(
+                    field.lstrip('-')
+                ).to_python(value)
+                for field, value in zip(self.cursor_ordering, values)
+            }
+        except Exception:
+            raise NotFound('Некорректный курсор.')
+
+    def encode_cursor(self, instance):
+        """Возвращает значение параметра cursor для позиции объекта."""
+        values = []
+        for field in self.cursor_ordering:
+            value = getattr(instance, field.lstrip('-'))
+            values.append(
+                value.isoformat() if hasattr(value, 'isoformat') else value
+            )
+        return urlsafe_b64encode(json.dumps(values).encode()).decode()
+
+    def get_next_link(self):
+        if not self.use_cursor:
+            return super().get_next_link()
+        if not self.has_next:
+            return None
+        return replace_query_param(
+            self.request.build_absolute_uri(),
+            self.cursor_query_param,
+            self.encode_cursor(self.page[-1])
+        )
+
+    def get_paginated_response(self, data):
+        if not self.use_cursor:
+            response = super().get_paginated_response(data)
+            response['X-Pagination-Count'] = (
+                self.page.paginator.count_strategy
+            )
+            return response
+        return Response({
+            'next': self.get_next_link(),
+            'previous': None,
+            'results': data,
+        })
+
+    def get_html_context(self):
+        if not self.use_cursor:
+            return super().get_html_context()
+        return {
+            'previous_url': None,
+            'next_url': self.get_next_link(),
+            'page_links': [],
+        }
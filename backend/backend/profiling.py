@@ -0,0 +1,70 @@
+import os
+from glob import glob
+from random import random
+from threading import Lock
+from time import strftime
+from uuid import uuid4
+
+from django.conf import settings
+from rest_framework.authentication import TokenAuthentication
+from rest_framework.exceptions import APIException
+
+from backend.constants import PROFILING_HEADER, PROFILING_MAX_FILES
+
+PROFILE_SUFFIX = '.prof'
+TAG_SEPARATOR = '__'
+
+# В процессе может работать только один профилировщик одновременно.
+profiler_lock = Lock()
+
+
+def is_staff_request(request):
+    """Проверяет, что запрос отправлен сотрудником: по сессии или по токену.
+    Токен проверяется только для запросов с заголовком профилирования."""
+    user = getattr(request, 'user', None)
+    if user is not None and user.is_staff:
+        return True
+    try:
+        result = TokenAuthentication().authenticate(request)
+    except APIException:
+        return False
+    return result is not None and result[0].is_staff
+
+
+def should_profile(request):
+    """Проверяет, нужно ли профилировать запрос: сотрудник передал
+    заголовок X-Profile или запрос попал в выборку
+    PROFILING_SAMPLE_RATE."""
+    if request.META.get(PROFILING_HEADER):
+        return is_staff_request(request)
+    rate = settings.PROFILING_SAMPLE_RATE
+    return rate > 0 and random() < rate
+
+
+def profile_paths(url_name='*', action='*'):
+    """Возвращает пути сохраненных профилей, от старых к новым."""
+    return sorted(glob(os.path.join(
+        settings.PROFILING_DIR,
+        f'*{TAG_SEPARATOR}{url_name}{TAG_SEPARATOR}{action}{PROFILE_SUFFIX}'
+    )))
+
+
+def save_profile(profiler, url_name, action):
+    """Сохраняет профиль запроса и удаляет самые старые профили сверх
+    PROFILING_MAX_FILES. Имя файла содержит время, имя маршрута
+    и действие. Возвращает имя файла."""
+    name = TAG_SEPARATOR.join((
+        f'{strftime("%Y%m%dT%H%M%S")}-{uuid4().hex[:8]}',
+        url_name or 'unresolved',
+        action or 'none',
+    )) + PROFILE_SUFFIX
+    os.makedirs(settings.PROFILING_DIR, exist_ok=True)
+    path = os.path.join(settings.PROFILING_DIR, name)
+    profiler.dump_stats(f'{path}.tmp')
+    os.replace(f'{path}.tmp', path)
+    for old_path in profile_paths()[:-PROFILING_MAX_FILES]:
+        try:
+            os.remove(old_path)
+        except OSError:
+            pass
+    return name
@@ -57,6 +57,7 @@ INSTALLED_APPS = [
 ]
 
 MIDDLEWARE = [
+    'backend.middleware.InstrumentationMiddleware',
     'django.middleware.security.SecurityMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.common.CommonMiddleware',
@@ -64,6 +65,7 @@ MIDDLEWARE = [
     'django.contrib.auth.middleware.AuthenticationMiddleware',
     'django.contrib.messages.middleware.MessageMiddleware',
     'django.middleware.clickjacking.XFrameOptionsMiddleware',
+    'backend.middleware.ProfilingMiddleware',
 ]
 
 ROOT_URLCONF = 'backend.urls'
@@ -103,6 +105,86 @@ DATABASES = {
     }
 }
 
+if os.getenv('DB_ENGINE') == 'sqlite':
+    DATABASES = {
+        'default': {
+            'ENGINE': 'django.db.backends.sqlite3',
+            'NAME': os.getenv('SQLITE_NAME', BASE_DIR / 'db.sqlite3'),
+        }
+    }
+
+CACHE_LOCATION = os.getenv('CACHE_LOCATION', '/tmp/foodgram_cache')
+
+# default: counts of paginated lists and other short-lived data;
+# responses: anonymous API responses, one entry per query string;
+# stamps: version and generation stamps, never culled, since losing
+# a stamp invalidates every cache entry built on it.
+CACHES = {
+    'default': {
+        'BACKEND': 'django.core.cache.backends.filebased.FileBasedCache',
+        'LOCATION': CACHE_LOCATION,
+        'OPTIONS': {
+            'MAX_ENTRIES': int(os.getenv('CACHE_MAX_ENTRIES', 1000)),
+        },
+    },
+    'responses': {
+        'BACKEND': 'django.core.cache.backends.filebased.FileBasedCache',
+        'LOCATION': os.path.join(CACHE_LOCATION, 'responses'),
+        'OPTIONS': {
+            'MAX_ENTRIES': int(
+                os.getenv('RESPONSE_CACHE_MAX_ENTRIES', 2000)
+            ),
+        },
+    },
+    'stamps': {
+        'BACKEND': 'django.core.cache.backends.filebased.FileBasedCache',
+        'LOCATION': os.path.join(CACHE_LOCATION, 'stamps'),
+        'OPTIONS': {
+            'MAX_ENTRIES': 10 ** 9,
+        },
+    },
+}
+
+# Request instrumentation: requests exceeding the number of SQL queries
+# or the total SQL time (ms) are logged as warnings.
+REQUEST_QUERY_BUDGET = int(os.getenv('REQUEST_QUERY_BUDGET', 20))
+REQUEST_SQL_TIME_BUDGET = int(os.getenv('REQUEST_SQL_TIME_BUDGET', 200))
+
+# Request metrics: each gunicorn worker writes its metrics to METRICS_DIR,
+# the /metrics/ endpoint sums them and is available only from the listed
+# addresses and networks.
+METRICS_DIR = os.getenv('METRICS_DIR', '/tmp/foodgram_metrics')
+METRICS_ALLOWED_IPS = os.getenv(
+    'METRICS_ALLOWED_IPS',
+    '127.0.0.1,10.0.0.0/8,172.16.0.0/12,192.168.0.0/16'
+).split(',')
+
+# Request profiling: staff requests with the X-Profile header and a random
+# share of all requests are profiled, profiles are kept in PROFILING_DIR.
+PROFILING_DIR = os.getenv('PROFILING_DIR', '/tmp/foodgram_profiles')
+PROFILING_SAMPLE_RATE = float(os.getenv('PROFILING_SAMPLE_RATE', 0))
+
+# Slow query log: SQL statements longer than SLOW_QUERY_THRESHOLD (ms)
+# are logged with the project stack and, optionally, the EXPLAIN output.
+SLOW_QUERY_THRESHOLD = int(os.getenv('SLOW_QUERY_THRESHOLD', 100))
+SLOW_QUERY_EXPLAIN = os.getenv('SLOW_QUERY_EXPLAIN', 'False') == 'True'
+
+LOGGING = {
+    'version': 1,
+    'disable_existing_loggers': False,
+    'handlers': {
+        'console': {
+            'class': 'logging.StreamHandler',
+        },
+    },
+    'loggers': {
+        'backend': {
+            'handlers': ['console'],
+            'level': os.getenv('BACKEND_LOG_LEVEL', 'INFO'),
+        },
+    },
+}
+
 
 # Password validation
 # https://docs.djangoproject.com/en/3.2/ref/settings/#auth-password-validators
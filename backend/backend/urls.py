@@ -18,11 +18,13 @@ from django.urls import include, path, re_path
 from django.views.generic import TemplateView
 
 from api.views import redirection
+from backend.metrics import metrics_view
 
 urlpatterns = [
     path('admin/', admin.site.urls),
     path('api/', include('api.urls')),
-    re_path(r's/', redirection),
+    path('metrics/', metrics_view, name='metrics'),
+    re_path(r'^s/(?P<code>[0-9A-Za-z]+)/?$', redirection, name='short-link'),
     path(
         'redoc/',
         TemplateView.as_view(template_name='redoc.html'),
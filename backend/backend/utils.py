@@ -1,39 +1,220 @@
 import base64
-from random import choice
+import csv
+import json
+from uuid import uuid4
 
+from django.contrib.auth import get_user_model
+from django.core.cache import caches
 from django.core.files.base import ContentFile
+from django.db import transaction
+from django.db.models import F, Sum
 from rest_framework import serializers
 
 from backend.constants import SYMBOLS
+from recipes.models import Recipe, RecipeIngredient, ShoppingCartIngredient
 
+User = get_user_model()
 
-def create_shopping_cart(recipe_list):
+GENERATION_KEY = 'generation:{}'
+
+
+class Echo:
+    """Буфер для csv.writer, возвращающий записанную строку."""
+    def write(self, value):
+        return value
+
+
+def shopping_cart_to_txt(ingredients):
     """Формирует список покупок в текстовом формате."""
-    ingredients_list = {}
-    for recipe in recipe_list:
-        ingredients = recipe.recipeingredients.all()
-        for ingredient in ingredients:
-            name = ingredient.ingredient.name
-            unit = ingredient.ingredient.measurement_unit
-            amount = ingredient.amount
-            if ingredients_list.get((name, unit)):
-                ingredients_list[(name, unit)] += amount
-            else:
-                ingredients_list[(name, unit)] = amount
-    shopping_cart = 'Список покупок:\n\n'
-    for ingredient, amount in ingredients_list.items():
-        shopping_cart += (
-            f'  \N{BULLET} {ingredient[0]} ({ingredient[-1]}) - {amount}\n')
-    return shopping_cart
-
-
-def create_short_link(request_url):
-    """Создает короткую ссылку на основе полного адреса."""
-    url = request_url.split('api/')
-    short_link = url[0] + 's/'
-    for _ in range(5):
-        short_link += choice(SYMBOLS)
-    return short_link
+    yield 'Список покупок:\n\n'
+    for ingredient in ingredients:
+        yield (
+            f'  \N{BULLET} {ingredient["name"]} '
+            f'({ingredient["measurement_unit"]}) - {ingredient["amount"]}\n'
+        )
+
+
+def shopping_cart_to_csv(ingredients):
+    """Формирует список покупок в формате CSV."""
+    writer = csv.writer(Echo())
+    yield writer.writerow(('name', 'measurement_unit', 'amount'))
+    for ingredient in ingredients:
+        yield writer.writerow((
+            ingredient['name'],
+            ingredient['measurement_unit'],
+            ingredient['amount']
+        ))
+
+
+def shopping_cart_to_json(ingredients):
+    """Формирует список покупок в формате JSON."""
+    yield '['
+    separator = ''
+    for ingredient in ingredients:
+        yield separator + json.dumps(ingredient, ensure_ascii=False)
+        separator = ', '
+    yield ']'
+
+
+SHOPPING_CART_WRITERS = {
+    'txt': shopping_cart_to_txt,
+    'csv': shopping_cart_to_csv,
+    'json': shopping_cart_to_json,
+}
+
+
+def get_shopping_cart_ingredients(user):
+    """Возвращает суммарное количество каждого ингредиента
+    из рецептов в списке покупок пользователя."""
+    return user.shopping_cart_ingredients.values(
+        'amount',
+        name=F('ingredient__name'),
+        measurement_unit=F('ingredient__measurement_unit')
+    ).order_by('name')
+
+
+def aggregate_shopping_carts():
+    """Вычисляет суммарное количество ингредиентов в списках покупок
+    всех пользователей по рецептам в списках покупок."""
+    return RecipeIngredient.objects.filter(
+        recipe__shopping_cart__isnull=False
+    ).values(
+        'ingredient',
+        holder=F('recipe__shopping_cart__holder')
+    ).annotate(total=Sum('amount')).order_by()
+
+
+def get_recipe_amounts(recipe):
+    """Возвращает суммарное количество каждого ингредиента рецепта:
+    ингредиент может быть указан в рецепте несколько раз."""
+    return {
+        item['ingredient_id']: item['total']
+        for item in RecipeIngredient.objects.filter(
+            recipe=recipe
+        ).values('ingredient_id').annotate(total=Sum('amount')).order_by()
+    }
+
+
+def update_shopping_cart_ingredients(holder_ids, deltas):
+    """Изменяет суммарное количество ингредиентов в списках покупок
+    пользователей на указанные величины."""
+    deltas = {
+        ingredient_id: delta for ingredient_id, delta in deltas.items()
+        if delta
+    }
+    if not holder_ids or not deltas:
+        return
+    with transaction.atomic():
+        list(User.objects.select_for_update().filter(
+            id__in=holder_ids
+        ).values_list('id', flat=True))
+        items = {
+            (item.holder_id, item.ingredient_id): item
+            for item in ShoppingCartIngredient.objects.filter(
+                holder_id__in=holder_ids, ingredient_id__in=deltas
+            )
+        }
+        to_create, to_update, to_delete = [], [], []
+        for holder_id in holder_ids:
+            for ingredient_id, delta in deltas.items():
+                item = items.get((holder_id, ingredient_id))
+                if item is None:
+                    if delta > 0:
+                        to_create.append(ShoppingCartIngredient(
+                            holder_id=holder_id,
+                            ingredient_id=ingredient_id,
+                            amount=delta
+                        ))
+                    continue
+                item.amount += delta
+                if item.amount > 0:
+                    to_update.append(item)
+                else:
+                    to_delete.append(item.id)
+        ShoppingCartIngredient.objects.bulk_create(to_create)
+        ShoppingCartIngredient.objects.bulk_update(to_update, ('amount',))
+        ShoppingCartIngredient.objects.filter(id__in=to_delete).delete()
+
+
+def create_shopping_cart(ingredients, file_format):
+    """Формирует список покупок в указанном формате по частям."""
+    return SHOPPING_CART_WRITERS[file_format](ingredients.iterator())
+
+
+def get_recipes_limit(request):
+    """Возвращает ограничение количества рецептов автора из параметра
+    запроса recipes_limit."""
+    limit = request.query_params.get('recipes_limit')
+    if not limit:
+        return None
+    try:
+        limit = int(limit)
+    except ValueError:
+        raise serializers.ValidationError('Некорректный запрос')
+    if limit < 0:
+        raise serializers.ValidationError('Некорректный запрос')
+    return limit
+
+
+def get_recipe_previews(author_ids, limit=None):
+    """Возвращает последние рецепты каждого из авторов одним запросом.
+    Если указан limit, не более limit рецептов каждого автора отбираются
+    оконной функцией."""
+    previews = {author_id: [] for author_id in author_ids}
+    if not author_ids:
+        return previews
+    if limit is None:
+        recipes = Recipe.objects.filter(author_id__in=author_ids)
+    else:
+        placeholders = ', '.join(['%s'] * len(author_ids))
+        recipes = Recipe.objects.raw(
+            'SELECT id, name, cooking_time, image, author_id FROM ('
+            '  SELECT id, name, cooking_time, image, author_id, pub_date,'
+            '  ROW_NUMBER() OVER ('
+            '    PARTITION BY author_id ORDER BY pub_date DESC, id DESC'
+            '  ) AS position'
+            f'  FROM {Recipe._meta.db_table}'
+            f'  WHERE author_id IN ({placeholders})'
+            ') AS ranked WHERE position <= %s '
+            'ORDER BY pub_date DESC, id DESC',
+            (*author_ids, limit)
+        )
+    for recipe in recipes:
+        previews[recipe.author_id].append(recipe)
+    return previews
+
+
+def create_short_link_code(recipe_id):
+    """Создает код короткой ссылки, записывая id рецепта
+    в системе счисления с основанием 62."""
+    code = ''
+    while True:
+        recipe_id, index = divmod(recipe_id, len(SYMBOLS))
+        code = SYMBOLS[index] + code
+        if not recipe_id:
+            return code
+
+
+def get_generations(tables):
+    """Возвращает метки версий таблиц базы данных. Метка меняется при
+    каждом изменении объектов таблицы, поэтому входит в ключи кэша
+    данных, построенных по этим таблицам. Метки хранятся в кэше stamps,
+    из которого записи не вытесняются."""
+    stamps = caches['stamps']
+    keys = [GENERATION_KEY.format(table) for table in sorted(tables)]
+    generations = stamps.get_many(keys)
+    for key in keys:
+        if key not in generations:
+            stamps.add(key, uuid4().hex, None)
+            generations[key] = stamps.get(key)
+    return [generations[key] for key in keys]
+
+
+def bump_generation(model):
+    """Меняет метку версии таблицы модели."""
+    caches['stamps'].set(
+        GENERATION_KEY.format(model._meta.db_table), uuid4().hex, None
+    )
 
 
 class Base64ImageField(serializers.ImageField):
@@ -44,3 +225,42 @@ class Base64ImageField(serializers.ImageField):
             ext = format.split('/')[-1]
             data = ContentFile(base64.b64decode(imgstr), name='temp.' + ext)
         return super().to_internal_value(data)
+
+
+class PrimaryKeyField(serializers.PrimaryKeyRelatedField):
+    """Поле первичного ключа, не загружающее объект при валидации.
+    Объекты для всех значений загружает сериализатор одним запросом."""
+    def to_internal_value(self, data):
+        if isinstance(data, bool):
+            self.fail('incorrect_type', data_type=type(data).__name__)
+        try:
+            return int(data)
+        except (TypeError, ValueError):
+            self.fail('incorrect_type', data_type=type(data).__name__)
+
+
+def percentile(values, percent):
+    """Возвращает перцентиль отсортированного списка значений."""
+    index = max(0, round(len(values) * percent / 100) - 1)
+    return values[min(index, len(values) - 1)]
+
+
+def compare_results(result, baseline, max_regression):
+    """Сравнивает результаты измерения эндпоинта с сохраненными ранее.
+    Ухудшением считается рост медианы времени ответа больше чем
+    на max_regression процентов, рост количества SQL-запросов или ошибок.
+    Возвращает описание изменений и признак ухудшения."""
+    if baseline is None:
+        return 'нет данных', False
+    base = max(baseline['p50'], 0.01)
+    change = (result['p50'] - base) / base * 100
+    queries = 0
+    if result['queries'] is not None and baseline['queries'] is not None:
+        queries = result['queries'] - baseline['queries']
+    regression = (change > max_regression or queries > 0
+                  or result.get('errors', 0) > baseline.get('errors', 0))
+    return (
+        f'p50 {change:+.1f}%, запросов {queries:+d}'
+        + (' УХУДШЕНИЕ' if regression else ''),
+        regression
+    )
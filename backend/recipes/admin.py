@@ -1,14 +1,31 @@
 from django.contrib import admin
 from django.contrib.auth import get_user_model
 from django.contrib.auth.admin import UserAdmin as BaseUserAdmin
+from django.db.models import Count, IntegerField, OuterRef, Subquery
+from django.db.models.functions import Coalesce
 
 from recipes.models import (Favorite, Ingredient, Link, Recipe,
-                            RecipeIngredient, ShoppingCart, Tag)
+                            RecipeIngredient, ShoppingCart,
+                            ShoppingCartIngredient, Tag)
 from users.models import Subscription
 
 User = get_user_model()
 
 
+def count_related(queryset, field):
+    """Возвращает подзапрос, считающий объекты queryset,
+    связанные с объектом основного запроса через поле field."""
+    return Coalesce(
+        Subquery(
+            queryset.filter(**{field: OuterRef('pk')}).order_by().values(
+                field
+            ).annotate(count=Count('pk')).values('count'),
+            output_field=IntegerField()
+        ),
+        0
+    )
+
+
 @admin.register(User)
 class UserAdmin(BaseUserAdmin):
     model = User
@@ -27,14 +44,27 @@ class UserAdmin(BaseUserAdmin):
         'avatar',
     )
     search_fields = ('username', 'email',)
-
-    @admin.display(description='Количество рецептов')
+    show_full_result_count = False
+
+    def get_queryset(self, request):
+        return super().get_queryset(request).annotate(
+            recipes_count=count_related(Recipe.objects.all(), 'author'),
+            subscriptions_count=count_related(
+                Subscription.objects.all(), 'subscribed_on'
+            )
+        )
+
+    @admin.display(
+        description='Количество рецептов', ordering='recipes_count'
+    )
     def recipes_count(self, obj):
-        return obj.recipes.count()
+        return obj.recipes_count
 
-    @admin.display(description='Количество подписчиков')
+    @admin.display(
+        description='Количество подписчиков', ordering='subscriptions_count'
+    )
     def subscriptions_count(self, obj):
-        return obj.subscribed.count()
+        return obj.subscriptions_count
 
 
 @admin.register(Subscription)
@@ -43,6 +73,9 @@ class SubscriptionAdmin(admin.ModelAdmin):
         'user',
         'subscribed_on'
     )
+    list_select_related = ('user', 'subscribed_on')
+    autocomplete_fields = ('user', 'subscribed_on')
+    show_full_result_count = False
 
 
 @admin.register(Tag)
@@ -62,6 +95,7 @@ class IngredientAdmin(admin.ModelAdmin):
         'measurement_unit'
     )
     search_fields = ('name',)
+    show_full_result_count = False
 
 
 @admin.register(RecipeIngredient)
@@ -72,11 +106,15 @@ class RecipeIngredientAdmin(admin.ModelAdmin):
         'ingredient',
         'amount'
     )
+    list_select_related = ('recipe', 'ingredient')
+    autocomplete_fields = ('recipe', 'ingredient')
+    show_full_result_count = False
 
 
 class IngredientsInline(admin.StackedInline):
     model = RecipeIngredient
     extra = 0
+    autocomplete_fields = ('ingredient',)
 
 
 @admin.register(Recipe)
@@ -92,10 +130,20 @@ class RecipeAdmin(admin.ModelAdmin):
     )
     search_fields = ('name', 'author__username')
     list_filter = ('tags',)
+    list_select_related = ('author',)
+    autocomplete_fields = ('author',)
+    show_full_result_count = False
 
-    @admin.display(description='Добавленно в избранное')
+    def get_queryset(self, request):
+        return super().get_queryset(request).annotate(
+            favorite_count=count_related(Favorite.objects.all(), 'recipe')
+        )
+
+    @admin.display(
+        description='Добавленно в избранное', ordering='favorite_count'
+    )
     def favorite_count(self, obj):
-        return Favorite.objects.filter(recipe=obj).count()
+        return obj.favorite_count
 
 
 @admin.register(Favorite)
@@ -104,6 +152,9 @@ class FavoriteAdmin(admin.ModelAdmin):
         'holder',
         'recipe'
     )
+    list_select_related = ('holder', 'recipe')
+    autocomplete_fields = ('holder', 'recipe')
+    show_full_result_count = False
 
 
 @admin.register(ShoppingCart)
@@ -112,11 +163,26 @@ class ShoppingCartAdmin(admin.ModelAdmin):
         'holder',
         'recipe'
     )
+    list_select_related = ('holder', 'recipe')
+    autocomplete_fields = ('holder', 'recipe')
+    show_full_result_count = False
+
+
+@admin.register(ShoppingCartIngredient)
+class ShoppingCartIngredientAdmin(admin.ModelAdmin):
+    list_display = (
+        'holder',
+        'ingredient',
+        'amount'
+    )
+    list_select_related = ('holder', 'ingredient')
+    show_full_result_count = False
 
 
 @admin.register(Link)
 class LinkAdmin(admin.ModelAdmin):
     list_display = (
-        'url',
-        'short_link'
+        'code',
+        'recipe'
     )
+    list_select_related = ('recipe',)
@@ -0,0 +1,194 @@
+import json
+from time import perf_counter
+from urllib.parse import urlencode
+
+from django.contrib.auth import get_user_model
+from django.conf import settings
+from django.core.cache import caches
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+from django.db.models import Count
+from django.test.utils import CaptureQueriesContext, override_settings
+from django.urls import reverse
+from rest_framework.authtoken.models import Token
+from rest_framework.test import APIClient
+
+from backend.constants import BENCHMARK_MAX_REGRESSION, BENCHMARK_REQUESTS
+from backend.utils import compare_results, percentile
+from recipes.models import Ingredient, Recipe, Tag
+
+User = get_user_model()
+
+
+class Command(BaseCommand):
+    help = ('Измеряет время ответа и количество запросов к базе данных '
+            'основных эндпоинтов API и сравнивает их с сохраненными '
+            'результатами.')
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--requests', type=int, default=BENCHMARK_REQUESTS,
+            help='Количество измеряемых запросов к каждому эндпоинту.'
+        )
+        parser.add_argument(
+            '--warmup', type=int, default=2,
+            help='Количество запросов перед измерением.'
+        )
+        parser.add_argument(
+            '--endpoint', action='append',
+            help='Название эндпоинта, можно указать несколько раз.'
+        )
+        parser.add_argument(
+            '--clear-cache', action='store_true',
+            help='Очищать кэш перед каждым запросом.'
+        )
+        parser.add_argument(
+            '--save', metavar='PATH',
+            help='Сохранить результаты в файл JSON.'
+        )
+        parser.add_argument(
+            '--baseline', metavar='PATH',
+            help='Сравнить результаты с сохраненными ранее.'
+        )
+        parser.add_argument(
+            '--max-regression', type=float,
+            default=BENCHMARK_MAX_REGRESSION,
+            help='Допустимое увеличение медианы времени ответа в процентах.'
+        )
+
+    def get_user(self):
+        """Возвращает пользователя с самым большим списком покупок."""
+        user = User.objects.annotate(
+            recipes_in_cart=Count('shopping_cart', distinct=True),
+            subscriptions=Count('subscriber', distinct=True)
+        ).order_by('-recipes_in_cart', '-subscriptions', 'id').first()
+        if user is None or not Recipe.objects.exists():
+            raise CommandError(
+                'Нет данных для измерения, выполните generate_data.'
+            )
+        return user
+
+    def get_endpoints(self):
+        """Возвращает список эндпоинтов: название, адрес и признак
+        запроса от имени пользователя."""
+        recipes = reverse('recipes-list')
+        tags = Tag.objects.order_by('id').values_list('slug', flat=True)[:2]
+        ingredient = Ingredient.objects.order_by('id').values_list(
+            'name', flat=True
+        ).first() or ''
+        last_page = max(1, Recipe.objects.count() // 6)
+        return [
+            ('recipes', recipes, False),
+            ('recipes-auth', recipes, True),
+            ('recipes-tags',
+             f'{recipes}?{urlencode([("tags", tag) for tag in tags])}', True),
+            ('recipes-favorited', f'{recipes}?is_favorited=1', True),
+            ('recipes-last-page', f'{recipes}?page={last_page}', True),
+            ('recipes-cursor', f'{recipes}?cursor=', True),
+            ('recipe-detail',
+             reverse('recipes-detail', args=(Recipe.objects.values_list(
+                 'id', flat=True
+             ).first(),)), True),
+            ('subscriptions',
+             f'{reverse("users-subscriptions")}?recipes_limit=3', True),
+            ('download-shopping-cart',
+             reverse('recipes-download-shopping-cart'), True),
+            ('users', reverse('users-list'), True),
+            ('tags', reverse('tags-list'), False),
+            ('ingredients-search',
+             f'{reverse("ingredients-list")}?'
+             f'{urlencode({"name": ingredient[:3]})}', False),
+        ]
+
+    def measure(self, client, path, options):
+        """Выполняет запросы к эндпоинту и возвращает результаты."""
+        timings, queries, status = [], 0, None
+        for number in range(options['warmup'] + options['requests']):
+            if options['clear_cache']:
+                for alias in settings.CACHES:
+                    caches[alias].clear()
+            with CaptureQueriesContext(connection) as context:
+                start = perf_counter()
+                response = client.get(path)
+                if response.streaming:
+                    b''.join(response.streaming_content)
+                elapsed = perf_counter() - start
+            if number >= options['warmup']:
+                timings.append(elapsed * 1000)
+                queries = max(queries, len(context))
+                status = response.status_code
+        timings.sort()
+        return {
+            'status': status,
+            'p50': round(percentile(timings, 50), 2),
+            'p90': round(percentile(timings, 90), 2),
+            'p99': round(percentile(timings, 99), 2),
+            'mean': round(sum(timings) / len(timings), 2),
+            'queries': queries,
+        }
+
+    def handle(self, *args, **options):
+        if options['requests'] < 1:
+            raise CommandError('Количество запросов должно быть больше 0.')
+        baseline = {}
+        if options['baseline']:
+            try:
+                with open(options['baseline'], encoding='utf-8') as file:
+                    baseline = json.load(file)['endpoints']
+            except (OSError, ValueError, KeyError) as error:
+                raise CommandError(
+                    f'Не удалось прочитать результаты: {error}'
+                )
+        user = self.get_user()
+        token, _ = Token.objects.get_or_create(user=user)
+        anonymous = APIClient()
+        authenticated = APIClient()
+        authenticated.credentials(HTTP_AUTHORIZATION=f'Token {token.key}')
+        endpoints = self.get_endpoints()
+        if options['endpoint']:
+            endpoints = [
+                endpoint for endpoint in endpoints
+                if endpoint[0] in options['endpoint']
+            ]
+        self.stdout.write(
+            f'База данных: {connection.vendor}, пользователь: {user}, '
+            f'запросов к эндпоинту: {options["requests"]}.'
+        )
+        self.stdout.write(
+            f'{"эндпоинт":<24}{"код":>5}{"p50":>10}{"p90":>10}{"p99":>10}'
+            f'{"запросов":>10}  сравнение'
+        )
+        results, regressions = {}, []
+        with override_settings(ALLOWED_HOSTS=['*']):
+            for name, path, is_authenticated in endpoints:
+                result = self.measure(
+                    authenticated if is_authenticated else anonymous,
+                    path, options
+                )
+                results[name] = result
+                comparison, regression = compare_results(
+                    result, baseline.get(name), options['max_regression']
+                )
+                if regression:
+                    regressions.append(name)
+                self.stdout.write(
+                    f'{name:<24}{result["status"]:>5}{result["p50"]:>10}'
+                    f'{result["p90"]:>10}{result["p99"]:>10}'
+                    f'{result["queries"]:>10}  '
+                    + (comparison if options['baseline'] else '')
+                )
+        if options['save']:
+            with open(options['save'], 'w', encoding='utf-8') as file:
+                json.dump(
+                    {
+                        'database': connection.vendor,
+                        'requests': options['requests'],
+                        'endpoints': results,
+                    },
+                    file, ensure_ascii=False, indent=2
+                )
+            self.stdout.write(f'Результаты сохранены в {options["save"]}.')
+        if regressions:
+            raise CommandError(
+                f'Ухудшение на эндпоинтах: {", ".join(regressions)}.'
+            )
@@ -0,0 +1,214 @@
+import random
+from itertools import accumulate
+
+from django.contrib.auth import get_user_model
+from django.contrib.auth.hashers import make_password
+from django.core.management import call_command
+from django.core.management.base import BaseCommand, CommandError
+from django.db import reset_queries
+from django.utils.crypto import get_random_string
+
+from api.catalog import ingredient_catalog, tag_catalog
+from backend.constants import GENERATE_DATA_BATCH_SIZE
+from backend.utils import bump_generation
+from recipes.models import (Favorite, Ingredient, Recipe, RecipeIngredient,
+                            ShoppingCart, Tag)
+from users.models import Subscription
+
+
+User = get_user_model()
+
+WORDS = (
+    'быстрый', 'домашний', 'летний', 'пряный', 'сытный', 'легкий',
+    'салат', 'суп', 'пирог', 'соус', 'омлет', 'рагу', 'каша', 'запеканка',
+    'с курицей', 'с грибами', 'с сыром', 'с овощами', 'по-деревенски',
+)
+MEASUREMENT_UNITS = ('г', 'кг', 'мл', 'л', 'шт', 'ст. л.', 'ч. л.')
+
+
+def skewed_weights(count):
+    """Возвращает накопленные веса, при которых первые элементы выбираются
+    намного чаще последних (распределение Ципфа)."""
+    return list(accumulate(1 / rank for rank in range(1, count + 1)))
+
+
+def sample_skewed(population, cum_weights, count, exclude=None):
+    """Выбирает до count разных элементов с учетом весов."""
+    count = min(count, len(population) - (exclude is not None))
+    result = set()
+    for _ in range(count * 10):
+        if len(result) >= count:
+            break
+        item = random.choices(population, cum_weights=cum_weights)[0]
+        if item != exclude:
+            result.add(item)
+    return result
+
+
+class Command(BaseCommand):
+    help = ('Создает синтетические данные для нагрузочного тестирования: '
+            'пользователей, рецепты, избранное, списки покупок и подписки.')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--users', type=int, default=100,
+                            help='Количество пользователей.')
+        parser.add_argument('--recipes', type=int, default=1000,
+                            help='Количество рецептов.')
+        parser.add_argument('--ingredients', type=int, default=500,
+                            help='Минимальное количество ингредиентов.')
+        parser.add_argument('--tags', type=int, default=3,
+                            help='Минимальное количество тегов.')
+        parser.add_argument('--ingredients-per-recipe', type=int, default=8,
+                            help='Количество ингредиентов в рецепте.')
+        parser.add_argument('--favorites', type=int, default=20,
+                            help='Количество рецептов в избранном '
+                                 'у пользователя.')
+        parser.add_argument('--carts', type=int, default=5,
+                            help='Количество рецептов в списке покупок '
+                                 'у пользователя.')
+        parser.add_argument('--subscriptions', type=int, default=10,
+                            help='Количество подписок у пользователя.')
+        parser.add_argument('--password', default='benchmark',
+                            help='Пароль всех создаваемых пользователей.')
+        parser.add_argument('--seed', type=int,
+                            help='Начальное значение генератора случайных '
+                                 'чисел для воспроизводимых данных.')
+
+    def bulk_create(self, model, objects):
+        """Сохраняет объекты пачками, не накапливая их в памяти."""
+        batch = []
+        for obj in objects:
+            batch.append(obj)
+            if len(batch) >= GENERATE_DATA_BATCH_SIZE:
+                model.objects.bulk_create(batch)
+                batch = []
+                reset_queries()
+        model.objects.bulk_create(batch)
+
+    def create_tags(self, count):
+        """Создает недостающие теги и возвращает id всех тегов."""
+        existing = Tag.objects.count()
+        run = get_random_string(6).lower()
+        Tag.objects.bulk_create(
+            Tag(name=f'Тег {run} {number}', slug=f'tag-{run}-{number}')
+            for number in range(count - existing)
+        )
+        return list(Tag.objects.values_list('id', flat=True))
+
+    def create_ingredients(self, count):
+        """Создает недостающие ингредиенты и возвращает id всех
+        ингредиентов."""
+        existing = Ingredient.objects.count()
+        run = get_random_string(6).lower()
+        self.bulk_create(Ingredient, (
+            Ingredient(
+                name=f'ингредиент {run} {number}',
+                measurement_unit=random.choice(MEASUREMENT_UNITS)
+            )
+            for number in range(count - existing)
+        ))
+        return list(Ingredient.objects.values_list('id', flat=True))
+
+    def create_users(self, count, password, prefix):
+        """Создает пользователей и возвращает их id."""
+        password = make_password(password)
+        self.bulk_create(User, (
+            User(
+                username=f'{prefix}{number}',
+                email=f'{prefix}{number}@example.com',
+                first_name=random.choice(('Анна', 'Иван', 'Мария', 'Петр')),
+                last_name=random.choice(('Иванова', 'Петров', 'Смирнова')),
+                password=password
+            )
+            for number in range(count)
+        ))
+        return list(User.objects.filter(
+            username__startswith=prefix
+        ).order_by('id').values_list('id', flat=True))
+
+    def create_recipes(self, count, author_ids):
+        """Создает рецепты авторов и возвращает их id. Часть авторов
+        публикует намного больше рецептов, чем остальные."""
+        cum_weights = skewed_weights(len(author_ids))
+        self.bulk_create(Recipe, (
+            Recipe(
+                name=' '.join(random.sample(WORDS, 3)).capitalize(),
+                text=' '.join(random.choices(WORDS, k=30)),
+                cooking_time=random.randint(5, 180),
+                image='recipes/images/benchmark.png',
+                author_id=random.choices(
+                    author_ids, cum_weights=cum_weights
+                )[0]
+            )
+            for _ in range(count)
+        ))
+        return list(Recipe.objects.filter(
+            author_id__in=author_ids
+        ).order_by('id').values_list('id', flat=True))
+
+    def handle(self, *args, **options):
+        if (options['users'] < 2 or options['recipes'] < 1
+                or options['tags'] < 1):
+            raise CommandError(
+                'Нужно хотя бы два пользователя, один рецепт и один тег.'
+            )
+        random.seed(options['seed'])
+        prefix = f'bench_{get_random_string(6).lower()}_'
+        tag_ids = self.create_tags(options['tags'])
+        ingredient_ids = self.create_ingredients(options['ingredients'])
+        user_ids = self.create_users(
+            options['users'], options['password'], prefix
+        )
+        recipe_ids = self.create_recipes(options['recipes'], user_ids)
+        self.bulk_create(RecipeIngredient, (
+            RecipeIngredient(
+                recipe_id=recipe_id,
+                ingredient_id=ingredient_id,
+                amount=random.randint(1, 500)
+            )
+            for recipe_id in recipe_ids
+            for ingredient_id in random.sample(
+                ingredient_ids,
+                min(options['ingredients_per_recipe'], len(ingredient_ids))
+            )
+        ))
+        self.bulk_create(Recipe.tags.through, (
+            Recipe.tags.through(recipe_id=recipe_id, tag_id=tag_id)
+            for recipe_id in recipe_ids
+            for tag_id in random.sample(
+                tag_ids, random.randint(1, min(3, len(tag_ids)))
+            )
+        ))
+        popular_recipes = random.sample(recipe_ids, len(recipe_ids))
+        recipe_weights = skewed_weights(len(popular_recipes))
+        for model, count in ((Favorite, options['favorites']),
+                             (ShoppingCart, options['carts'])):
+            self.bulk_create(model, (
+                model(holder_id=user_id, recipe_id=recipe_id)
+                for user_id in user_ids
+                for recipe_id in sample_skewed(
+                    popular_recipes, recipe_weights, count
+                )
+            ))
+        author_weights = skewed_weights(len(user_ids))
+        self.bulk_create(Subscription, (
+            Subscription(user_id=user_id, subscribed_on_id=author_id)
+            for user_id in user_ids
+            for author_id in sample_skewed(
+                user_ids, author_weights, options['subscriptions'],
+                exclude=user_id
+            )
+        ))
+        # bulk_create не отправляет сигналы: суммарные списки покупок,
+        # справочники и метки версий таблиц обновляются явно.
+        call_command('rebuild_shopping_carts', stdout=self.stdout)
+        tag_catalog.invalidate()
+        ingredient_catalog.invalidate()
+        for model in (Tag, Ingredient, User, Recipe, Recipe.tags.through,
+                      RecipeIngredient, Favorite, ShoppingCart, Subscription):
+            bump_generation(model)
+        self.stdout.write(self.style.SUCCESS(
+            f'Создано пользователей {len(user_ids)} '
+            f'(логины {prefix}N, пароль {options["password"]}), '
+            f'рецептов {len(recipe_ids)}.'
+        ))
@@ -0,0 +1,179 @@
+import csv
+import json
+import os
+import re
+from itertools import islice
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import reset_queries
+
+from api.catalog import ingredient_catalog
+from backend.constants import (INGREDIENT_IMPORT_BATCH_SIZE,
+                               INGREDIENT_NAME_LENGTH, JSON_READ_CHUNK_SIZE,
+                               MEASUREMENT_UNIT_LENGTH)
+from backend.utils import bump_generation
+from recipes.models import Ingredient
+
+SEPARATORS = re.compile(r'[\s,]*')
+
+
+def iter_json_array(file, chunk_size=JSON_READ_CHUNK_SIZE):
+    """Читает элементы JSON-массива из файла по одному, не загружая
+    файл в память целиком."""
+    decoder = json.JSONDecoder()
+    buffer, position, started, eof = '', 0, False, False
+    while True:
+        position = SEPARATORS.match(buffer, position).end()
+        if position < len(buffer):
+            if not started:
+                if buffer[position] != '[':
+                    raise ValueError('Файл должен содержать JSON-массив.')
+                started = True
+                position += 1
+                continue
+            if buffer[position] == ']':
+                return
+            try:
+                item, end = decoder.raw_decode(buffer, position)
+            except ValueError:
+                if eof:
+                    raise
+            else:
+                if end < len(buffer) or eof:
+                    yield item
+                    position = end
+                    continue
+        elif eof:
+            raise ValueError('Неожиданный конец файла.')
+        chunk = file.read(chunk_size)
+        eof = not chunk
+        buffer = buffer[position:] + chunk
+        position = 0
+
+
+def read_csv(file):
+    """Возвращает строки CSV-файла в виде пар (номер строки, данные)."""
+    reader = csv.reader(file)
+    for row in reader:
+        if len(row) != 2:
+            yield reader.line_num, None
+            continue
+        yield reader.line_num, {
+            'name': row[0], 'measurement_unit': row[1]
+        }
+
+
+def read_json(file):
+    """Возвращает элементы JSON-файла в виде пар (номер элемента, данные).
+    Поддерживается как список ингредиентов, так и фикстура Django."""
+    for number, item in enumerate(iter_json_array(file), 1):
+        if isinstance(item, dict) and isinstance(item.get('fields'), dict):
+            item = item['fields']
+        yield number, item if isinstance(item, dict) else None
+
+
+READERS = {
+    'csv': read_csv,
+    'json': read_json,
+}
+
+
+def clean_ingredient(item):
+    """Возвращает пару (название, единица измерения) или None,
+    если данные ингредиента некорректны."""
+    if item is None:
+        return None
+    name = item.get('name')
+    unit = item.get('measurement_unit')
+    if not isinstance(name, str) or not isinstance(unit, str):
+        return None
+    name, unit = name.strip(), unit.strip()
+    if (not name or not unit or len(name) > INGREDIENT_NAME_LENGTH
+            or len(unit) > MEASUREMENT_UNIT_LENGTH):
+        return None
+    return name, unit
+
+
+class Command(BaseCommand):
+    help = ('Загружает ингредиенты из файла CSV или JSON, пропуская '
+            'ингредиенты, которые уже есть в базе данных.')
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            'path',
+            nargs='?',
+            default='data/ingredients.csv',
+            help='Путь к файлу с ингредиентами.'
+        )
+        parser.add_argument(
+            '--format',
+            choices=READERS,
+            help='Формат файла. По умолчанию определяется по расширению.'
+        )
+        parser.add_argument(
+            '--batch-size',
+            type=int,
+            default=INGREDIENT_IMPORT_BATCH_SIZE,
+            help='Количество ингредиентов, сохраняемых одним запросом.'
+        )
+
+    def save_batch(self, batch):
+        """Сохраняет пачку ингредиентов, пропуская уже существующие.
+        Возвращает количество добавленных ингредиентов."""
+        unique = dict.fromkeys(batch)
+        existing = set(Ingredient.objects.filter(
+            name__in={name for name, _ in unique}
+        ).values_list('name', 'measurement_unit'))
+        new = [pair for pair in unique if pair not in existing]
+        Ingredient.objects.bulk_create(
+            (Ingredient(name=name, measurement_unit=unit)
+             for name, unit in new),
+            ignore_conflicts=True
+        )
+        return len(new)
+
+    def handle(self, *args, **options):
+        path = options['path']
+        file_format = (options['format']
+                       or os.path.splitext(path)[1].lstrip('.').lower())
+        if file_format not in READERS:
+            raise CommandError(
+                'Не удалось определить формат файла, укажите --format.'
+            )
+        if options['batch_size'] < 1:
+            raise CommandError('Размер пачки должен быть больше 0.')
+        inserted = skipped = invalid = 0
+        try:
+            with open(path, encoding='utf-8', newline='') as file:
+                ingredients = READERS[file_format](file)
+                while True:
+                    chunk = list(islice(ingredients, options['batch_size']))
+                    if not chunk:
+                        break
+                    batch = []
+                    for number, item in chunk:
+                        ingredient = clean_ingredient(item)
+                        if ingredient is None:
+                            invalid += 1
+                            if options['verbosity'] > 1:
+                                self.stderr.write(
+                                    f'Некорректные данные: запись {number}.'
+                                )
+                            continue
+                        batch.append(ingredient)
+                    if batch:
+                        added = self.save_batch(batch)
+                        inserted += added
+                        skipped += len(batch) - added
+                    # При DEBUG = True Django хранит все выполненные запросы.
+                    reset_queries()
+        except (OSError, ValueError) as error:
+            raise CommandError(f'Ошибка чтения файла: {error}')
+        finally:
+            if inserted:
+                ingredient_catalog.invalidate()
+                bump_generation(Ingredient)
+        self.stdout.write(self.style.SUCCESS(
+            f'Ингредиенты загружены: добавлено {inserted}, '
+            f'пропущено существующих {skipped}, с ошибками {invalid}.'
+        ))
@@ -0,0 +1,52 @@
+import io
+import pstats
+
+from django.core.management.base import BaseCommand, CommandError
+
+from backend.profiling import profile_paths
+
+SORT_KEYS = ('cumulative', 'tottime', 'ncalls')
+
+
+class Command(BaseCommand):
+    help = ('Объединяет профили запросов, сохраненные ProfilingMiddleware, '
+            'и выводит функции, на которые ушло больше всего времени.')
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--url-name', default='*',
+            help='Имя маршрута, например recipes-list.'
+        )
+        parser.add_argument(
+            '--action', default='*',
+            help='Действие представления, например list или retrieve.'
+        )
+        parser.add_argument(
+            '--sort', choices=SORT_KEYS, default='cumulative',
+            help='Порядок сортировки функций.'
+        )
+        parser.add_argument(
+            '--limit', type=int, default=30,
+            help='Количество выводимых функций.'
+        )
+        parser.add_argument(
+            '--last', type=int,
+            help='Учитывать только указанное количество последних профилей.'
+        )
+
+    def handle(self, *args, **options):
+        paths = profile_paths(options['url_name'], options['action'])
+        if options['last']:
+            paths = paths[-options['last']:]
+        if not paths:
+            raise CommandError('Нет сохраненных профилей.')
+        output = io.StringIO()
+        stats = pstats.Stats(stream=output)
+        for path in paths:
+            try:
+                stats.add(path)
+            except (OSError, TypeError, ValueError, EOFError) as error:
+                self.stderr.write(f'Не удалось прочитать {path}: {error}')
+        stats.sort_stats(options['sort']).print_stats(options['limit'])
+        self.stdout.write(f'Профилей: {len(paths)}.')
+        self.stdout.write(output.getvalue())
@@ -0,0 +1,58 @@
+from django.core.management.base import BaseCommand, CommandError
+from django.db import transaction
+
+from backend.utils import aggregate_shopping_carts
+from recipes.models import ShoppingCartIngredient
+
+
+class Command(BaseCommand):
+    help = ('Пересчитывает суммарные списки покупок пользователей '
+            'по рецептам в списках покупок.')
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--check',
+            action='store_true',
+            help='Только проверить списки покупок, не изменяя их.'
+        )
+
+    def handle(self, *args, **options):
+        expected = {
+            (item['holder'], item['ingredient']): item['total']
+            for item in aggregate_shopping_carts().iterator()
+        }
+        actual = {
+            (holder_id, ingredient_id): amount
+            for holder_id, ingredient_id, amount
+            in ShoppingCartIngredient.objects.values_list(
+                'holder_id', 'ingredient_id', 'amount'
+            ).iterator()
+        }
+        mismatches = sum(
+            expected.get(key) != actual.get(key)
+            for key in expected.keys() | actual.keys()
+        )
+        if options['check']:
+            if mismatches:
+                raise CommandError(
+                    f'Найдено расхождений в списках покупок: {mismatches}.'
+                )
+            self.stdout.write(self.style.SUCCESS('Списки покупок актуальны.'))
+            return
+        with transaction.atomic():
+            ShoppingCartIngredient.objects.all().delete()
+            ShoppingCartIngredient.objects.bulk_create(
+                (
+                    ShoppingCartIngredient(
+                        holder_id=holder_id,
+                        ingredient_id=ingredient_id,
+                        amount=amount
+                    )
+                    for (holder_id, ingredient_id), amount in expected.items()
+                ),
+                batch_size=1000
+            )
+        self.stdout.write(self.style.SUCCESS(
+            f'Списки покупок пересчитаны: записей {len(expected)}, '
+            f'исправлено расхождений {mismatches}.'
+        ))
@@ -0,0 +1,357 @@
+import json
+import re
+from collections import defaultdict
+from threading import Lock, Thread, local
+from time import perf_counter
+from urllib.error import HTTPError, URLError
+from urllib.parse import urlencode
+from urllib.request import Request, urlopen
+
+from django.contrib.auth import get_user_model
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connections
+from django.db.models import Q
+from django.test.utils import override_settings
+from django.urls import Resolver404, resolve
+from rest_framework.authtoken.models import Token
+from rest_framework.test import APIClient
+
+from backend.constants import BENCHMARK_MAX_REGRESSION, REPLAY_HTTP_TIMEOUT
+from backend.utils import compare_results, percentile
+
+User = get_user_model()
+
+METHODS = ('GET', 'HEAD', 'OPTIONS', 'POST', 'PUT', 'PATCH', 'DELETE')
+SAFE_METHODS = ('GET', 'HEAD', 'OPTIONS')
+# Количество SQL-запросов передает InstrumentationMiddleware
+# в заголовке Server-Timing.
+SERVER_TIMING_QUERIES = re.compile(r'\bdb;[^,]*desc="(\d+) queries"')
+
+
+def parse_record(line):
+    """Возвращает запрос из строки JSONL или None, если строка не похожа
+    на записанный запрос."""
+    try:
+        record = json.loads(line)
+    except ValueError:
+        return None
+    if not isinstance(record, dict):
+        return None
+    method = str(record.get('method', 'GET')).upper()
+    path = record.get('path')
+    if method not in METHODS or not isinstance(path, str) \
+            or not path.startswith('/'):
+        return None
+    query = record.get('query') or ''
+    if isinstance(query, dict):
+        query = urlencode(query, doseq=True)
+    elif not isinstance(query, str):
+        return None
+    user = record.get('user')
+    return {
+        'method': method,
+        'path': path,
+        'query': query.lstrip('?'),
+        'body': record.get('body'),
+        'user': str(user) if user is not None else None,
+    }
+
+
+def get_route(method, path):
+    """Возвращает название маршрута, по которому группируются
+    результаты."""
+    try:
+        url_name = resolve(path).url_name
+    except Resolver404:
+        url_name = 'unresolved'
+    return f'{method} {url_name}'
+
+
+def get_queries(headers):
+    """Возвращает количество SQL-запросов из заголовка Server-Timing."""
+    match = SERVER_TIMING_QUERIES.search(headers.get('Server-Timing') or '')
+    return int(match.group(1)) if match else None
+
+
+class InProcessSender:
+    """Выполняет запросы в текущем процессе через тестовый клиент DRF."""
+
+    def __init__(self, options):
+        self._local = local()
+
+    def send(self, record, token):
+        client = getattr(self._local, 'client', None)
+        if client is None:
+            client = self._local.client = APIClient()
+        extra = {}
+        if token is not None:
+            extra['HTTP_AUTHORIZATION'] = f'Token {token}'
+        path = record['path']
+        if record['query']:
+            path = f'{path}?{record["query"]}'
+        response = client.generic(
+            record['method'], path,
+            data=('' if record['body'] is None
+                  else json.dumps(record['body'])),
+            content_type='application/json', **extra
+        )
+        if response.streaming:
+            b''.join(response.streaming_content)
+        return response.status_code, get_queries(response)
+
+    def close(self):
+        """Закрывает соединения с базой данных рабочего потока."""
+        connections.close_all()
+
+
+class HttpSender:
+    """Выполняет запросы к запущенному серверу по HTTP."""
+
+    def __init__(self, options):
+        self.base_url = options['base_url'].rstrip('/')
+
+    def send(self, record, token):
+        url = f'{self.base_url}{record["path"]}'
+        if record['query']:
+            url = f'{url}?{record["query"]}'
+        headers = {'Accept': 'application/json'}
+        data = None
+        if record['body'] is not None:
+            data = json.dumps(record['body']).encode()
+            headers['Content-Type'] = 'application/json'
+        if token is not None:
+            headers['Authorization'] = f'Token {token}'
+        request = Request(
+            url, data=data, headers=headers, method=record['method']
+        )
+        try:
+            with urlopen(request, timeout=REPLAY_HTTP_TIMEOUT) as response:
+                response.read()
+                return response.status, get_queries(response.headers)
+        except HTTPError as error:
+            error.read()
+            return error.code, get_queries(error.headers)
+        except (URLError, OSError):
+            return 0, None
+
+    def close(self):
+        pass
+
+
+SENDERS = {
+    'inprocess': InProcessSender,
+    'http': HttpSender,
+}
+
+
+class Command(BaseCommand):
+    help = ('Воспроизводит записанные запросы из файла JSONL в текущем '
+            'процессе или по HTTP и сравнивает время ответа и количество '
+            'запросов к базе данных по маршрутам с сохраненными '
+            'результатами.')
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            'path',
+            help='Файл JSONL, каждая строка которого содержит method, path, '
+                 'query, body и user (логин или email).'
+        )
+        parser.add_argument(
+            '--mode', choices=SENDERS, default='inprocess',
+            help='Выполнять запросы в текущем процессе или по HTTP.'
+        )
+        parser.add_argument(
+            '--base-url', default='http://127.0.0.1:8000',
+            help='Адрес сервера для режима http.'
+        )
+        parser.add_argument(
+            '--concurrency', type=int, default=1,
+            help='Количество одновременных запросов.'
+        )
+        parser.add_argument(
+            '--repeat', type=int, default=1,
+            help='Сколько раз воспроизвести файл.'
+        )
+        parser.add_argument(
+            '--read-only', action='store_true',
+            help='Пропускать запросы, изменяющие данные.'
+        )
+        parser.add_argument(
+            '--save', metavar='PATH',
+            help='Сохранить результаты в файл JSON.'
+        )
+        parser.add_argument(
+            '--baseline', metavar='PATH',
+            help='Сравнить результаты с сохраненными ранее.'
+        )
+        parser.add_argument(
+            '--max-regression', type=float,
+            default=BENCHMARK_MAX_REGRESSION,
+            help='Допустимое увеличение медианы времени ответа в процентах.'
+        )
+
+    def read_records(self, path, read_only):
+        """Читает записанные запросы, пропуская некорректные строки."""
+        records, skipped = [], 0
+        try:
+            with open(path, encoding='utf-8') as file:
+                for line in file:
+                    if not line.strip():
+                        continue
+                    record = parse_record(line)
+                    if record is None or (
+                        read_only and record['method'] not in SAFE_METHODS
+                    ):
+                        skipped += 1
+                        continue
+                    records.append(record)
+        except OSError as error:
+            raise CommandError(f'Ошибка чтения файла: {error}')
+        if skipped:
+            self.stderr.write(f'Пропущено строк: {skipped}.')
+        if not records:
+            raise CommandError('В файле нет запросов для воспроизведения.')
+        return records
+
+    def get_tokens(self, records):
+        """Возвращает токены пользователей, от имени которых записаны
+        запросы. Запросы неизвестных пользователей выполняются анонимно."""
+        tokens = {}
+        for name in {record['user'] for record in records} - {None}:
+            user = User.objects.filter(
+                Q(username=name) | Q(email=name)
+            ).first()
+            if user is None:
+                self.stderr.write(
+                    f'Пользователь {name} не найден, его запросы '
+                    f'выполняются анонимно.'
+                )
+                tokens[name] = None
+                continue
+            tokens[name] = Token.objects.get_or_create(user=user)[0].key
+        return tokens
+
+    def run(self, sender, jobs, concurrency):
+        """Выполняет запросы в нескольких потоках и возвращает результаты
+        и общее время."""
+        jobs = iter(jobs)
+        lock = Lock()
+        results = []
+
+        def worker():
+            try:
+                while True:
+                    with lock:
+                        job = next(jobs, None)
+                    if job is None:
+                        return
+                    record, token = job
+                    start = perf_counter()
+                    status, queries = sender.send(record, token)
+                    results.append((
+                        get_route(record['method'], record['path']),
+                        status, (perf_counter() - start) * 1000, queries
+                    ))
+            finally:
+                sender.close()
+
+        threads = [Thread(target=worker) for _ in range(concurrency)]
+        start = perf_counter()
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        return results, perf_counter() - start
+
+    def summarize(self, results):
+        """Группирует результаты по маршрутам."""
+        routes = defaultdict(list)
+        for route, status, elapsed, queries in results:
+            routes[route].append((status, elapsed, queries))
+        summary = {}
+        for route, items in sorted(routes.items()):
+            timings = sorted(elapsed for _, elapsed, _ in items)
+            queries = [count for _, _, count in items if count is not None]
+            summary[route] = {
+                'requests': len(items),
+                'errors': sum(
+                    1 for status, _, _ in items
+                    if status == 0 or status >= 500
+                ),
+                'p50': round(percentile(timings, 50), 2),
+                'p95': round(percentile(timings, 95), 2),
+                'p99': round(percentile(timings, 99), 2),
+                'queries': max(queries) if queries else None,
+                'mean_queries': (round(sum(queries) / len(queries), 1)
+                                 if queries else None),
+            }
+        return summary
+
+    def handle(self, *args, **options):
+        if options['concurrency'] < 1 or options['repeat'] < 1:
+            raise CommandError(
+                'Количество потоков и повторов должно быть больше 0.'
+            )
+        baseline = {}
+        if options['baseline']:
+            try:
+                with open(options['baseline'], encoding='utf-8') as file:
+                    baseline = json.load(file)['routes']
+            except (OSError, ValueError, KeyError) as error:
+                raise CommandError(
+                    f'Не удалось прочитать результаты: {error}'
+                )
+        records = self.read_records(options['path'], options['read_only'])
+        tokens = self.get_tokens(records)
+        jobs = [
+            (record, tokens.get(record['user']))
+            for _ in range(options['repeat'])
+            for record in records
+        ]
+        sender = SENDERS[options['mode']](options)
+        with override_settings(ALLOWED_HOSTS=['*']):
+            results, elapsed = self.run(
+                sender, jobs, options['concurrency']
+            )
+        summary = self.summarize(results)
+        throughput = round(len(results) / max(elapsed, 1e-9), 1)
+        self.stdout.write(
+            f'Режим: {options["mode"]}, потоков: {options["concurrency"]}, '
+            f'запросов: {len(results)}, время: {elapsed:.2f} с, '
+            f'пропускная способность: {throughput} запросов/с.'
+        )
+        self.stdout.write(
+            f'{"маршрут":<44}{"запр.":>7}{"ошиб.":>7}{"p50":>10}{"p95":>10}'
+            f'{"p99":>10}{"SQL":>7}  сравнение'
+        )
+        regressions = []
+        for route, result in summary.items():
+            comparison, regression = compare_results(
+                result, baseline.get(route), options['max_regression']
+            )
+            if regression:
+                regressions.append(route)
+            queries = result['queries']
+            self.stdout.write(
+                f'{route:<44}{result["requests"]:>7}{result["errors"]:>7}'
+                f'{result["p50"]:>10}{result["p95"]:>10}{result["p99"]:>10}'
+                f'{"-" if queries is None else queries:>7}  '
+                + (comparison if options['baseline'] else '')
+            )
+        if options['save']:
+            with open(options['save'], 'w', encoding='utf-8') as file:
+                json.dump(
+                    {
+                        'mode': options['mode'],
+                        'concurrency': options['concurrency'],
+                        'requests': len(results),
+                        'throughput': throughput,
+                        'routes': summary,
+                    },
+                    file, ensure_ascii=False, indent=2
+                )
+            self.stdout.write(f'Результаты сохранены в {options["save"]}.')
+        if regressions:
+            raise CommandError(
+                f'Ухудшение на маршрутах: {", ".join(regressions)}.'
+            )
@@ -0,0 +1,65 @@
+import re
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+def fill_link_code(apps, schema_editor):
+    Link = apps.get_model('recipes', 'Link')
+    Recipe = apps.get_model('recipes', 'Recipe')
+    recipe_ids = set(Recipe.objects.values_list('id', flat=True))
+    codes = set()
+    for link in Link.objects.all():
+        recipe = re.search(r'/recipes/(\d+)', link.url)
+        code = link.short_link.rstrip('/').rsplit('/', 1)[-1]
+        if (not recipe or int(recipe.group(1)) not in recipe_ids
+                or not code or code in codes):
+            link.delete()
+            continue
+        codes.add(code)
+        link.recipe_id = int(recipe.group(1))
+        link.code = code
+        link.save(update_fields=('recipe', 'code'))
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('recipes', '0004_ingredient_name_trgm_index'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='link',
+            name='code',
+            field=models.CharField(max_length=16, null=True, verbose_name='Код'),
+        ),
+        migrations.AddField(
+            model_name='link',
+            name='recipe',
+            field=models.ForeignKey(null=True, on_delete=django.db.models.deletion.CASCADE, related_name='links', to='recipes.recipe', verbose_name='Рецепт'),
+        ),
+        migrations.RunPython(fill_link_code, migrations.RunPython.noop),
+        migrations.RemoveField(
+            model_name='link',
+            name='short_link',
+        ),
+        migrations.RemoveField(
+            model_name='link',
+            name='url',
+        ),
+        migrations.AlterField(
+            model_name='link',
+            name='code',
+            field=models.CharField(max_length=16, unique=True, verbose_name='Код'),
+        ),
+        migrations.AlterField(
+            model_name='link',
+            name='recipe',
+            field=models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='links', to='recipes.recipe', verbose_name='Рецепт'),
+        ),
+        migrations.AlterModelOptions(
+            name='link',
+            options={'default_related_name': 'links', 'verbose_name': 'ссылки', 'verbose_name_plural': 'Ссылки'},
+        ),
+    ]
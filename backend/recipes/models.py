@@ -92,12 +92,20 @@ class Recipe(models.Model):
     pub_date = models.DateTimeField(
         'Дата публикации', auto_now_add=True
     )
+    updated_at = models.DateTimeField(
+        'Дата изменения', auto_now=True
+    )
 
     class Meta:
         verbose_name = 'рецепт'
         verbose_name_plural = 'Рецепты'
         default_related_name = 'recipes'
-        ordering = ('-pub_date',)
+        ordering = ('-pub_date', '-id')
+        indexes = [
+            models.Index(
+                fields=('-pub_date', '-id'), name='recipe_pub_date_id_idx'
+            ),
+        ]
 
     def __str__(self):
         return self.name
@@ -171,14 +179,52 @@ class ShoppingCart(ActionModel):
         return self.holder.username
 
 
+class ShoppingCartIngredient(models.Model):
+    """Модель для суммарного количества ингредиентов в списке покупок."""
+    holder = models.ForeignKey(
+        User,
+        on_delete=models.CASCADE,
+        verbose_name='Пользователь'
+    )
+    ingredient = models.ForeignKey(
+        Ingredient,
+        on_delete=models.CASCADE,
+        verbose_name='Ингредиент'
+    )
+    amount = models.PositiveIntegerField('Количество')
+
+    class Meta:
+        verbose_name = 'ингредиент списка покупок'
+        verbose_name_plural = 'Ингредиенты списков покупок'
+        default_related_name = 'shopping_cart_ingredients'
+        constraints = [
+            models.UniqueConstraint(
+                fields=['holder', 'ingredient'],
+                name='unique_shopping_cart_ingredient'
+            ),
+        ]
+
+    def __str__(self):
+        return self.holder.username
+
+
 class Link(models.Model):
     """Модель для коротких ссылок на рецепты."""
-    url = models.URLField()
-    short_link = models.URLField()
+    recipe = models.ForeignKey(
+        Recipe,
+        on_delete=models.CASCADE,
+        verbose_name='Рецепт'
+    )
+    code = models.CharField(
+        'Код',
+        max_length=constants.SHORT_LINK_CODE_LENGTH,
+        unique=True
+    )
 
     class Meta:
         verbose_name = 'ссылки'
         verbose_name_plural = 'Ссылки'
+        default_related_name = 'links'
 
     def __str__(self):
-        return self.short_link
+        return self.code
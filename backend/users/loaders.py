@@ -0,0 +1,70 @@
+from rest_framework.serializers import ListSerializer
+
+from .models import Subscription
+
+
+class SubscriptionLoader:
+    """Загрузчик подписок текущего пользователя в рамках одного запроса.
+
+    Собирает id пользователей, выводимых в ответе, и проверяет подписку
+    на всех сразу одним запросом. Результаты сохраняются до конца
+    запроса."""
+
+    def __init__(self, user):
+        self.user = user
+        self._pending = set()
+        self._subscribed = {}
+
+    def prime(self, user_ids):
+        """Добавляет id пользователей в очередь на проверку."""
+        self._pending.update(
+            user_id for user_id in user_ids if user_id not in self._subscribed
+        )
+
+    def set(self, user_id, subscribed):
+        """Сохраняет уже известный признак подписки."""
+        self._subscribed[user_id] = subscribed
+        self._pending.discard(user_id)
+
+    def is_subscribed(self, user_id):
+        """Проверяет подписку текущего пользователя на пользователя."""
+        if self.user.is_anonymous:
+            return False
+        if user_id not in self._subscribed:
+            self._pending.add(user_id)
+            self._load()
+        return self._subscribed[user_id]
+
+    def _load(self):
+        """Проверяет подписку на всех пользователей из очереди."""
+        user_ids, self._pending = self._pending, set()
+        subscribed = set(Subscription.objects.filter(
+            user=self.user, subscribed_on_id__in=user_ids
+        ).values_list('subscribed_on_id', flat=True))
+        for user_id in user_ids:
+            self._subscribed[user_id] = user_id in subscribed
+
+
+def get_subscription_loader(request):
+    """Возвращает загрузчик подписок, общий для всего запроса."""
+    loader = getattr(request, '_subscription_loader', None)
+    if loader is None:
+        loader = SubscriptionLoader(request.user)
+        request._subscription_loader = loader
+    return loader
+
+
+class SubscriptionListSerializer(ListSerializer):
+    """Сериализатор списка, передающий загрузчику подписок id всех
+    пользователей списка до вывода его элементов. Поле с id пользователя
+    задается атрибутом subscription_user_field сериализатора элемента."""
+
+    def to_representation(self, data):
+        items = list(data.all() if hasattr(data, 'all') else data)
+        request = self.context.get('request')
+        if request is not None:
+            field = self.child.subscription_user_field
+            get_subscription_loader(request).prime(
+                getattr(item, field) for item in items
+            )
+        return super().to_representation(items)
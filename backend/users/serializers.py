@@ -5,8 +5,9 @@ from rest_framework.serializers import (ModelSerializer,
                                         SerializerMethodField, ValidationError)
 from rest_framework.validators import UniqueTogetherValidator
 
-from backend.utils import Base64ImageField
+from backend.utils import Base64ImageField, get_recipes_limit
 
+from .loaders import SubscriptionListSerializer, get_subscription_loader
 from .models import Subscription
 
 User = get_user_model()
@@ -27,21 +28,20 @@ class UserMixin:
 class UserSerializer(UserSerializer):
     """Сериализатор для модели пользователей."""
     is_subscribed = SerializerMethodField()
+    subscription_user_field = 'id'
 
     class Meta(UserSerializer.Meta):
         fields = UserMixin.Meta.fields + ('is_subscribed', 'avatar')
+        list_serializer_class = SubscriptionListSerializer
 
     def get_is_subscribed(self, obj):
         """Проверяет наличие пользователя в списке подписок
-        текущего пользователя."""
-        user = self.context.get('request').user
-        if not user.is_anonymous:
-            subscription = user.subscriber.filter(subscribed_on=obj)
-        return (
-            True if not user.is_anonymous
-            and subscription.exists()
-            else False
-        )
+        текущего пользователя. Значение берется из аннотации queryset,
+        если она есть, иначе из общего для запроса загрузчика подписок."""
+        if hasattr(obj, 'is_subscribed'):
+            return obj.is_subscribed
+        loader = get_subscription_loader(self.context.get('request'))
+        return loader.is_subscribed(obj.id)
 
 
 class UserCreateSerializer(UserCreateSerializer):
@@ -78,26 +78,31 @@ class SubscribedUserSerialaizer(UserSerializer):
     subscribed_on = UserSerializer(read_only=True)
     recipes = SerializerMethodField()
     recipes_count = PrimaryKeyRelatedField(read_only=True)
+    subscription_user_field = 'subscribed_on_id'
 
     class Meta:
         model = Subscription
         fields = ('subscribed_on', 'recipes', 'recipes_count')
+        list_serializer_class = SubscriptionListSerializer
 
     def get_recipes(self, obj):
-        """Возвращает список рецептов пользователя."""
-        request = self.context.get('request')
-        limit = request.query_params.get('recipes_limit')
-        if limit:
-            try:
-                limit = int(limit)
-            except ValueError:
-                raise ValidationError('Некорректный запрос')
-        queryset = obj.subscribed_on.recipes.all()
-        serializer = RecipeSubscrubeSerializer(queryset[:limit], many=True)
+        """Возвращает список рецептов пользователя. Рецепты берутся
+        из контекста, если они загружены для всей страницы подписок."""
+        previews = self.context.get('recipe_previews')
+        if previews is not None and obj.subscribed_on_id in previews:
+            recipes = previews[obj.subscribed_on_id]
+        else:
+            limit = get_recipes_limit(self.context.get('request'))
+            recipes = obj.subscribed_on.recipes.all()[:limit]
+        serializer = RecipeSubscrubeSerializer(recipes, many=True)
         return serializer.data
 
     def to_representation(self, instance):
         """Изменяет вывод данных для запроса на подписку."""
+        if hasattr(instance, 'is_subscribed'):
+            get_subscription_loader(self.context.get('request')).set(
+                instance.subscribed_on_id, instance.is_subscribed
+            )
         data = super().to_representation(instance)
         user = data.pop('subscribed_on')
         recipes = data.pop('recipes')
@@ -1,21 +1,56 @@
 from django.contrib.auth import get_user_model
-from django.db.models import Count
+from django.db.models import BooleanField, Count, Exists, OuterRef, Value
 from djoser.conf import settings
 from djoser.views import UserViewSet
 from rest_framework import status
 from rest_framework.decorators import action
 from rest_framework.response import Response
 
+from backend.instrumentation import serializer_data
+from backend.mixins import ConditionalGetMixin
 from backend.paginations import Pagination
+from backend.utils import get_recipe_previews, get_recipes_limit
 
+from .models import Subscription
 from .serializers import SubscribeCreateSerialaizer
 
 User = get_user_model()
 
 
-class UserViewSet(UserViewSet):
+class UserViewSet(ConditionalGetMixin, UserViewSet):
     """Представление для обработки запросов к модели пользователей."""
     pagination_class = Pagination
+    cursor_ordering = ('id',)
+    conditional_actions = ('retrieve', 'me')
+
+    def get_conditional_state(self, request, *args, **kwargs):
+        """Возвращает идентификатор и дату изменения пользователя и признак
+        подписки на него текущего пользователя. Идентификатор входит
+        в ETag, чтобы ответы /me/ разных пользователей не совпадали. Дата
+        последнего изменения возвращается только для анонимного
+        пользователя."""
+        user = request.user
+        if self.action == 'me':
+            pk = user.pk
+        else:
+            pk = kwargs[self.lookup_url_kwarg or self.lookup_field]
+        if user.is_anonymous:
+            is_subscribed = Value(False, output_field=BooleanField())
+        else:
+            is_subscribed = Exists(Subscription.objects.filter(
+                user=user, subscribed_on=OuterRef('pk')
+            ))
+        try:
+            row = self.filter_queryset(self.get_queryset()).filter(
+                pk=pk
+            ).annotate(is_subscribed=is_subscribed).values_list(
+                'pk', 'updated_at', 'is_subscribed'
+            ).first()
+        except ValueError:
+            return None
+        if row is None:
+            return None
+        return [row], row[1] if user.is_anonymous else None
 
     def get_permissions(self):
         """Устанавливает разрешения в зависимости от выполняемого действия."""
@@ -57,8 +92,18 @@ class UserViewSet(UserViewSet):
     def get_subscription_instance(self, request):
         """Возвращает список объектов подписок текущего пользователя."""
         return request.user.subscriber.annotate(
-            recipes_count=Count('subscribed_on__recipes')
-        ).select_related('subscribed_on')
+            recipes_count=Count('subscribed_on__recipes'),
+            is_subscribed=Value(True, output_field=BooleanField())
+        ).select_related('subscribed_on').order_by('id')
+
+    def get_recipes_context(self, subscriptions):
+        """Загружает рецепты авторов страницы подписок одним запросом."""
+        context = self.get_serializer_context()
+        context['recipe_previews'] = get_recipe_previews(
+            [subscription.subscribed_on_id for subscription in subscriptions],
+            get_recipes_limit(self.request)
+        )
+        return context
 
     @action(('GET',), detail=False)
     def subscriptions(self, request, *args, **kwargs):
@@ -66,10 +111,12 @@ class UserViewSet(UserViewSet):
         instance = self.get_subscription_instance(request)
         page = self.paginate_queryset(instance)
         if page is not None:
-            serializer = self.get_serializer(page, many=True)
-            return self.get_paginated_response(serializer.data)
+            serializer = self.get_serializer(
+                page, many=True, context=self.get_recipes_context(page)
+            )
+            return self.get_paginated_response(serializer_data(serializer))
         serializer = self.get_serializer(instance=instance)
-        return Response(serializer.data, status=status.HTTP_200_OK)
+        return Response(serializer_data(serializer), status=status.HTTP_200_OK)
 
     @action(('POST', 'DELETE',), detail=True)
     def subscribe(self, request, *args, **kwargs):
@@ -88,7 +135,9 @@ class UserViewSet(UserViewSet):
                 subscribed_on=self.get_object()
             )
             serializer = self.get_serializer(instance=instance)
-            return Response(serializer.data, status=status.HTTP_201_CREATED)
+            return Response(
+                serializer_data(serializer), status=status.HTTP_201_CREATED
+            )
         subscription = request.user.subscriber.filter(
             subscribed_on=self.get_object()
         )